@@ -4,6 +4,19 @@ from openpyxl.utils import get_column_letter
 from openpyxl.styles.differential import DifferentialStyle
 from openpyxl.formatting.rule import Rule
 
+from ews_engine import INPUT_COLUMNS, RATING_RULE, RULES
+
+def band_formula(rule, input_letters, row=4):
+    """Build the Excel status formula of a metric rule, with edges as fractions"""
+    numerator = f"'Input Data'!{input_letters[rule['numerator']]}{row}"
+    denominator = f"'Input Data'!{input_letters[rule['denominator']]}{row}"
+    operator = ">=" if rule['direction'] == 'min' else "<="
+    
+    formula = f' "{rule["labels"][-1]}"'
+    for edge, label in reversed(list(zip(rule['edges'], rule['labels']))):
+        formula = f'IF({numerator}/{denominator} {operator} {edge / 100:g}, "{label}",{formula})'
+    return f'=IF(ISBLANK({numerator}), "",{formula})'
+
 def create_ews_template(filename="EWS_Calculator_Template.xlsx"):
     try:
         wb = Workbook()
@@ -37,19 +50,13 @@ def create_ews_template(filename="EWS_Calculator_Template.xlsx"):
         red_dxf = DifferentialStyle(fill=red_fill)
         
         # Input Data Sheet
-        input_headers = [
-            "Period",
-            "Actual Procurement Volume",
-            "Target Procurement Volume",
-            "Actual Inventory Level",
-            "Planned Inventory Level",
-            "Outstanding Loan (Other Banks)",
-            "Approved Credit Limit",
-            "Cash Average Balance",
-            "Outstanding Loan Amount",
-            "Account Balance",
-            "Credit Rating"
-        ]
+        input_headers = (
+            ["Period"]
+            + [RULES['inputs'].get(col, col) for col in INPUT_COLUMNS]
+            + ["Credit Rating"]
+        )
+        input_letters = {col: get_column_letter(i) for i, col in enumerate(INPUT_COLUMNS, 2)}
+        rating_letter = get_column_letter(len(input_headers))
         
         input_sheet['A1'] = "EWS Criteria Calculator"
         input_sheet['A1'].font = Font(bold=True, size=14)
@@ -67,15 +74,11 @@ def create_ews_template(filename="EWS_Calculator_Template.xlsx"):
             input_sheet.column_dimensions[get_column_letter(col)].width = 20
             
         # Results Sheet
-        results_headers = [
-            "Period",
-            "PVR Status",
-            "ILR Status",
-            "OLR Status",
-            "CLR Status",
-            "ABR Status",
-            "Credit Status"
-        ]
+        results_headers = (
+            ["Period"]
+            + [f"{metric} Status" for metric in RULES['metrics']]
+            + ["Credit Status"]
+        )
         
         results_sheet['A1'] = "EWS Status Dashboard"
         results_sheet['A1'].font = Font(bold=True, size=14)
@@ -88,16 +91,13 @@ def create_ews_template(filename="EWS_Calculator_Template.xlsx"):
             cell.alignment = centered
             cell.border = border
             
-        # Set formulas for row 4
-        formulas = [
-            "=\'Input Data\'!A4",
-            "=IF(ISBLANK('Input Data'!B4), \"\",IF('Input Data'!B4/'Input Data'!C4 >= 0.5, \"Green\",IF('Input Data'!B4/'Input Data'!C4 >= 0.3, \"Yellow\",IF('Input Data'!B4/'Input Data'!C4 >= 0.1, \"Orange\", \"Red\"))))",
-            "=IF(ISBLANK('Input Data'!D4), \"\",IF('Input Data'!D4/'Input Data'!E4 <= 1.2, \"Green\",IF('Input Data'!D4/'Input Data'!E4 <= 1.5, \"Yellow\",IF('Input Data'!D4/'Input Data'!E4 <= 1.7, \"Orange\", \"Red\"))))",
-            "=IF(ISBLANK('Input Data'!F4), \"\",IF('Input Data'!F4/'Input Data'!G4 <= 0.15, \"Green\",IF('Input Data'!F4/'Input Data'!G4 <= 0.25, \"Yellow\", \"Orange\")))",
-            "=IF(ISBLANK('Input Data'!H4), \"\",IF('Input Data'!H4/'Input Data'!I4 >= 0.8, \"Green\",IF('Input Data'!H4/'Input Data'!I4 >= 0.5, \"Yellow\", \"Red\")))",
-            "=IF(ISBLANK('Input Data'!J4), \"\",IF('Input Data'!J4/'Input Data'!I4 >= 1, \"Green\", \"Orange\"))",
-            "=IF(ISBLANK('Input Data'!K4), \"\",SWITCH('Input Data'!K4,\"Good\", \"Green\",\"Dropped\", \"Yellow\",\"B1\", \"Orange\",\"B2\", \"Orange\",\"B3\", \"Orange\",\"Bad\", \"Red\",\"N/A\"))"
-        ]
+        # Set formulas for row 4, generated from the rule file
+        rating_cases = ",".join(f'"{rating}", "{status}"' for rating, status in RATING_RULE['statuses'].items())
+        formulas = (
+            ["=\'Input Data\'!A4"]
+            + [band_formula(rule, input_letters) for rule in RULES['metrics'].values()]
+            + [f"=IF(ISBLANK('Input Data'!{rating_letter}4), \"\",SWITCH('Input Data'!{rating_letter}4,{rating_cases},\"N/A\"))"]
+        )
         
         for col, formula in enumerate(formulas, 1):
             cell = results_sheet.cell(row=4, column=col)
@@ -142,7 +142,7 @@ def create_ews_template(filename="EWS_Calculator_Template.xlsx"):
         status_labels = ["Green", "Yellow", "Orange", "Red"]
         for i, status in enumerate(status_labels, 4):
             dashboard_sheet[f'A{i}'] = status
-            dashboard_sheet[f'B{i}'] = f'=COUNTIF(Results!B4:G100, "{status}")'
+            dashboard_sheet[f'B{i}'] = f'=COUNTIF(Results!B4:{get_column_letter(len(results_headers))}100, "{status}")'
             
         dashboard_sheet.column_dimensions['A'].width = 15
         dashboard_sheet.column_dimensions['B'].width = 15
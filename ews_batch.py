@@ -0,0 +1,202 @@
+"""Score EWS CSV, Parquet or Arrow IPC files from the command line without Streamlit
+
+Example:
+    python ews_batch.py "branches/*.csv" --output-dir results --format parquet --workers 8
+"""
+import argparse
+import datetime
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from ews_arrow import BACKENDS, score_arrow
+from ews_engine import (
+    add_streaks,
+    count_statuses,
+    merge_summaries,
+    new_summary,
+    score_frame,
+    status_columns,
+    summary_status_counts,
+    update_summary
+)
+from ews_export import EXPORT_FORMATS, iter_frame_chunks, write_export
+from ews_groups import DEFAULT_ENTITY_COLUMN, entity_rollup, score_grouped
+from ews_io import FILE_FORMATS, load_file, load_table
+from ews_parallel import score_shared, use_shared
+
+OUTPUT_FORMATS = list(EXPORT_FORMATS)
+
+
+def output_path(input_path, output_dir, output_format, kind='results'):
+    """Return the results (or rollup) file path for an input file"""
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, f"{stem}_ews_{kind}.{output_format}")
+
+
+def write_results(df_results, path, output_format):
+    """Write a results DataFrame in the requested format, a chunk at a time"""
+    write_export(iter_frame_chunks(df_results), path, output_format)
+
+
+def score_file(input_path, step_values, output_dir, output_format, date_range=None, period_days=None,
+               entity_col=None, group_workers=1, backend='numpy', chunk_workers=1):
+    """Score one file, write its results and return its running summary and parse stats
+
+    If the file has the entity column, rows are scored per entity and a
+    per-entity worst-status rollup is written next to the results. The arrow
+    backend scores the Arrow table as read, without building a pandas frame.
+    Large single-entity files are scored in row blocks across chunk_workers
+    processes over shared memory.
+    """
+    parse_stats = {}
+    extra_columns = (entity_col,) if entity_col else ()
+    summary = None
+    if backend == 'arrow':
+        table = load_table(input_path, date_range=date_range, stats=parse_stats, extra_columns=extra_columns)
+        grouped = entity_col if entity_col in table.column_names else None
+        df_results = add_streaks(score_arrow(table, entity_col=grouped), period_days, grouped)
+    else:
+        df = load_file(input_path, date_range=date_range, stats=parse_stats, extra_columns=extra_columns)
+        grouped = entity_col if entity_col and entity_col in df.columns else None
+        if grouped:
+            df_results = score_grouped(df, grouped, step_values, period_days=period_days, workers=group_workers)
+        elif use_shared(len(df), chunk_workers):
+            df_results, summary = score_shared(df, step_values, workers=chunk_workers)
+            df_results = add_streaks(df_results, period_days)
+            for col in status_columns(df_results):
+                if col not in summary['status_counts']:
+                    summary['status_counts'][col] = count_statuses(df_results[col])
+        else:
+            df_results = add_streaks(score_frame(df, step_values), period_days)
+
+    if grouped:
+        rollup = entity_rollup(df_results, grouped)
+        write_results(rollup, output_path(input_path, output_dir, output_format, 'rollup'), output_format)
+    write_results(df_results, output_path(input_path, output_dir, output_format), output_format)
+    if summary is None:
+        summary = update_summary(new_summary(), df_results)
+    return summary, parse_stats
+
+
+def expand_inputs(patterns):
+    """Expand glob patterns into a sorted list of unique file paths"""
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        paths.update(
+            path for path in matches
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in FILE_FORMATS
+        )
+    return sorted(paths)
+
+
+def summary_table(file_summaries):
+    """Build a long status-count table per file plus a combined total"""
+    rows = []
+    total = new_summary()
+    for path, summary in file_summaries.items():
+        total = merge_summaries(total, summary)
+        for metric, counts in summary_status_counts(summary).items():
+            for status, count in counts.items():
+                rows.append({'file': path, 'metric': metric, 'status': status, 'count': count})
+    for metric, counts in summary_status_counts(total).items():
+        for status, count in counts.items():
+            rows.append({'file': 'TOTAL', 'metric': metric, 'status': status, 'count': count})
+    return pd.DataFrame(rows, columns=['file', 'metric', 'status', 'count']), total
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Score EWS CSV, Parquet or Arrow IPC files in parallel")
+    parser.add_argument("inputs", nargs="+", help="Input files or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="ews_results", help="Directory for result files")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="csv", help="Result file format (xlsx splits across sheets past the Excel row limit)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--start-date", type=datetime.date.fromisoformat, help="First date to score (YYYY-MM-DD)")
+    parser.add_argument("--end-date", type=datetime.date.fromisoformat, help="Last date to score (YYYY-MM-DD)")
+    parser.add_argument("--entity-column", default=DEFAULT_ENTITY_COLUMN, help="Entity key column scored per entity when present (empty to disable)")
+    parser.add_argument("--group-workers", type=int, default=1, help="Worker processes per file for entity-grouped scoring")
+    parser.add_argument("--chunk-workers", type=int, help="Worker processes per large file for shared-memory block scoring (default: CPUs per concurrent file)")
+    parser.add_argument("--backend", choices=BACKENDS, default="numpy", help="Scoring backend (arrow scores Arrow tables with pyarrow.compute)")
+    parser.add_argument("--pvr-period-days", type=int, default=1, help="Days per consecutive PVR period")
+    parser.add_argument("--clr-period-days", type=int, default=1, help="Days per consecutive CLR period")
+    parser.add_argument("--procurement-step", type=int, default=1000, help="Step value for procurement amounts (does not change ratios)")
+    parser.add_argument("--inventory-step", type=int, default=1000, help="Step value for inventory amounts (does not change ratios)")
+    parser.add_argument("--loan-step", type=int, default=1000, help="Step value for loan amounts (does not change ratios)")
+    parser.add_argument("--balance-step", type=int, default=1000, help="Step value for balance amounts (does not change ratios)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Score all matched files across a process pool and write a combined summary"""
+    args = parse_args(argv)
+    step_values = {
+        'procurement': args.procurement_step,
+        'inventory': args.inventory_step,
+        'loan': args.loan_step,
+        'balance': args.balance_step
+    }
+
+    period_days = {'PVR': args.pvr_period_days, 'CLR': args.clr_period_days}
+    date_range = None
+    if args.start_date or args.end_date:
+        date_range = (args.start_date, args.end_date)
+
+    input_paths = expand_inputs(args.inputs)
+    if not input_paths:
+        print("No input files matched", file=sys.stderr)
+        return 2
+
+    output_paths = [output_path(path, args.output_dir, args.format) for path in input_paths]
+    if len(set(output_paths)) != len(output_paths):
+        print("Input files must have unique file names", file=sys.stderr)
+        return 2
+
+    chunk_workers = args.chunk_workers
+    if chunk_workers is None:
+        chunk_workers = max(1, (os.cpu_count() or 1) // max(1, min(args.workers, len(input_paths))))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+    file_summaries = {}
+    failures = 0
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {
+            executor.submit(
+                score_file, path, step_values, args.output_dir, args.format, date_range, period_days,
+                args.entity_column, args.group_workers, args.backend, chunk_workers
+            ): path
+            for path in input_paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                file_summaries[path], parse_stats = future.result()
+                print(f"Scored {file_summaries[path]['rows']:,} rows from {path}")
+                if parse_stats.get('rejected_count'):
+                    print(f"  Rejected {parse_stats['rejected_count']:,} malformed rows from {path}", file=sys.stderr)
+                    for rejected in parse_stats['rejected'][:5]:
+                        print(f"    line {rejected['line']}: {rejected['error']}: {rejected['text']!r}", file=sys.stderr)
+            except Exception as e:
+                failures += 1
+                print(f"Error processing {path}: {e}", file=sys.stderr)
+
+    file_summaries = dict(sorted(file_summaries.items()))
+    df_summary, total = summary_table(file_summaries)
+    summary_file = os.path.join(args.output_dir, "ews_summary.csv")
+    df_summary.to_csv(summary_file, index=False)
+
+    elapsed = time.perf_counter() - start
+    print(f"\nScored {total['rows']:,} rows from {len(file_summaries)} files in {elapsed:.2f}s")
+    print(f"Summary written to {summary_file}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""Benchmark the EWS scoring path on generated data of increasing size
+
+Each stage (parse, score, aggregate, chart build, export) is timed on its own
+and its peak traced memory recorded. Results are written as JSON and can be
+compared against an earlier run to catch regressions. Parse and score can be
+run with either scoring backend (NumPy or pyarrow.compute) for comparison.
+
+Example:
+    python ews_benchmark.py --sizes 1000 100000 1000000 --output bench.json
+    python ews_benchmark.py --sizes 1000 100000 1000000 --baseline bench.json
+    python ews_benchmark.py --sizes 1000000 --input-format parquet --backends numpy arrow
+    python ews_benchmark.py --sizes 20000000 --shared-workers 1 2 4 8 16
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from ews_arrow import BACKENDS, score_arrow
+from ews_charts import create_charts
+from ews_engine import add_streaks, new_summary, score_frame, summary_status_counts, summary_trend, update_summary
+from ews_export import EXPORT_FORMATS, iter_frame_chunks, write_export
+from ews_io import load_file, load_table
+from ews_parallel import score_shared
+from generate_ews_sample_data import generate_sample_data
+
+# Dataset sizes benchmarked by default
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000, 50_000_000]
+
+def build_dataset(rows):
+    """Return a reproducible sample DataFrame of the given number of rows"""
+    return generate_sample_data(rows, workers=os.cpu_count())
+
+
+def write_dataset(df, directory, input_format):
+    """Write a dataset as the file the parse stage reads"""
+    path = os.path.join(directory, f"ews_benchmark_{len(df)}.{input_format}")
+    if input_format == 'csv':
+        df.to_csv(path, index=False)
+    else:
+        df.to_parquet(path, index=False)
+    return path
+
+
+def measure(stage, function, repeat, trace_memory):
+    """Time a stage (best of repeat runs) and optionally trace its peak memory
+
+    Memory is traced in a separate run so tracing does not slow the timings.
+    Returns the stage result and its measurements.
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+
+    peak_mb = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            result = function()
+            peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+
+    return result, {'stage': stage, 'seconds': min(seconds), 'peak_mb': peak_mb}
+
+
+def build_charts(summary):
+    """Build the app's summary charts from a running summary"""
+    return create_charts(summary_status_counts(summary), summary_trend(summary))
+
+
+def benchmark_size(rows, directory, input_format, export_format, repeat, trace_memory, backends=('numpy',),
+                   shared_workers=()):
+    """Run every stage on one dataset size and return its measurements
+
+    Parse and score run once per backend; the later stages use the results of
+    the first backend, as they do not depend on it. The shared stage (scoring
+    plus the reduced summary in shared-memory block mode) runs once per
+    worker count in shared_workers.
+    """
+    path = write_dataset(build_dataset(rows), directory, input_format)
+    measurements = []
+
+    def run(stage, function, backend='numpy', workers=None):
+        result, measured = measure(stage, function, repeat, trace_memory)
+        measured['rows'] = rows
+        measured['backend'] = backend
+        measured['workers'] = workers
+        measured['rows_per_second'] = rows / measured['seconds'] if measured['seconds'] > 0 else None
+        measurements.append(measured)
+        print(f"{rows:>12,} {stage:<10} {backend:<6} {workers or '':>3} {measured['seconds']:>9.3f}s"
+              + (f" {measured['peak_mb']:>10,.1f} MB" if measured['peak_mb'] is not None else ""))
+        return result
+
+    try:
+        df_results = None
+        for backend in backends:
+            if backend == 'arrow':
+                table = run('parse', lambda: load_table(path), backend)
+                scored = run('score', lambda: add_streaks(score_arrow(table)), backend)
+                del table
+            else:
+                df = run('parse', lambda: load_file(path), backend)
+                scored = run('score', lambda: add_streaks(score_frame(df)), backend)
+                del df
+            if df_results is None:
+                df_results = scored
+            del scored
+        if shared_workers:
+            df = load_file(path)
+            for workers in shared_workers:
+                run('shared', lambda: score_shared(df, workers=workers), workers=workers)
+            del df
+        summary = run('aggregate', lambda: update_summary(new_summary(), df_results))
+        run('chart', lambda: build_charts(summary))
+        export_path = os.path.join(directory, f"ews_benchmark_{rows}_results.{export_format}")
+        run('export', lambda: write_export(iter_frame_chunks(df_results), export_path, export_format))
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+    return measurements
+
+
+def environment():
+    """Describe the machine and library versions a run was made on"""
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'pyarrow': pa.__version__
+    }
+
+
+def compare(results, baseline, tolerance, min_seconds):
+    """Return the measurements slower or larger than the baseline by more than tolerance
+
+    Timing differences below min_seconds are treated as noise. Baselines
+    written before backends were recorded count as numpy runs.
+    """
+    previous = {
+        (item['rows'], item['stage'], item.get('backend', 'numpy'), item.get('workers')): item
+        for item in baseline['results']
+    }
+    regressions = []
+    for item in results:
+        before = previous.get((item['rows'], item['stage'], item['backend'], item['workers']))
+        if before is None:
+            continue
+        slower = item['seconds'] - before['seconds']
+        if slower > min_seconds and item['seconds'] > before['seconds'] * (1 + tolerance):
+            regressions.append({**item, 'metric': 'seconds', 'baseline': before['seconds']})
+        if item['peak_mb'] is not None and before.get('peak_mb') is not None:
+            if item['peak_mb'] > before['peak_mb'] * (1 + tolerance) and item['peak_mb'] - before['peak_mb'] > 1:
+                regressions.append({**item, 'metric': 'peak_mb', 'baseline': before['peak_mb']})
+    return regressions
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark the EWS scoring path by dataset size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Dataset sizes in rows")
+    parser.add_argument("--input-format", choices=['csv', 'parquet'], default='csv', help="File format parsed")
+    parser.add_argument("--export-format", choices=list(EXPORT_FORMATS), default='csv.gz', help="Export format timed")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=['numpy'], help="Scoring backends benchmarked for parse and score")
+    parser.add_argument("--shared-workers", type=int, nargs="*", default=[], help="Worker counts timed for shared-memory block scoring, e.g. 1 2 4 8 16")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per stage (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory runs")
+    parser.add_argument("-o", "--output", default="ews_benchmark.json", help="JSON results file")
+    parser.add_argument("--baseline", help="Earlier JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown or growth over the baseline")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="Ignore timing differences below this")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the benchmark, write its JSON results and report regressions"""
+    args = parse_args(argv)
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="ews_benchmark_") as directory:
+        for rows in sorted(args.sizes):
+            results.extend(benchmark_size(
+                rows, directory, args.input_format, args.export_format, max(1, args.repeat), not args.no_memory,
+                args.backends, args.shared_workers
+            ))
+
+    report = {'environment': environment(), 'results': results}
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.tolerance, args.min_seconds)
+        for item in regressions:
+            print(
+                f"Regression: {item['rows']:,} rows {item['stage']} ({item['backend']}) {item['metric']} "
+                f"{item[item['metric']]:.3f} vs baseline {item['baseline']:.3f}",
+                file=sys.stderr
+            )
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Default memory budget of the shared result cache, overridable with EWS_CACHE_MAX_MB
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get('EWS_CACHE_MAX_MB', 2048)) * 1024 * 1024
+
+
+def content_hash(data):
+    """Return a hex digest identifying the content of an uploaded file"""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def estimate_nbytes(value):
+    """Estimate the memory held by a cached value"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pa.Table, pa.RecordBatch, pa.ChunkedArray)):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Thread-safe LRU cache of parsed frames and scored results with a byte budget"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """Return the cached value for key, or None, counting a hit or miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, nbytes=None, on_evict=None):
+        """Store a value, evicting least recently used entries to stay within budget
+
+        Values larger than the whole budget are not stored. on_evict, if given, is
+        called with the value when it leaves the cache.
+        """
+        if nbytes is None:
+            nbytes = estimate_nbytes(value)
+        with self._lock:
+            self._remove(key)
+            if nbytes > self.max_bytes:
+                if on_evict is not None:
+                    on_evict(value)
+                return value
+            self._entries[key] = (value, nbytes, on_evict)
+            self._bytes += nbytes
+            self._evict()
+        return value
+
+    def get_or_compute(self, key, compute, on_evict=None):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute(), on_evict=on_evict)
+        return value
+
+    def resize(self, max_bytes):
+        """Change the byte budget, evicting entries if it shrank"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        """Return hit/miss counters and memory usage"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            value, nbytes, on_evict = entry
+            self._bytes -= nbytes
+            if on_evict is not None:
+                on_evict(value)
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
@@ -0,0 +1,208 @@
+"""Plotly figures of the EWS summary charts, and downsampling of long trend series for them"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from ews_engine import STATUS_LABELS, WORST_COLUMN, status_columns, value_columns
+from ews_sweep import edge_name
+
+# Points kept per trend line, roughly one per horizontal pixel of a wide chart
+MAX_TREND_POINTS = 2000
+
+# Charts with more points than this in total are drawn with WebGL
+WEBGL_MIN_POINTS = 5000
+
+# Bins of the EWS score distribution chart
+SCORE_BINS = 20
+
+
+def lttb_indices(x, y, n_out):
+    """Pick n_out points of a series with Largest-Triangle-Three-Buckets
+
+    x must be increasing. The first and last points are always kept; each
+    bucket in between keeps the point forming the largest triangle with the
+    previously kept point and the mean of the next bucket, which preserves
+    peaks and troughs. Returns the indices of the kept points.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket boundaries over the interior points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+        prev_x, prev_y = x[kept[bucket]], y[kept[bucket]]
+
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs(
+            (prev_x - next_x) * (y[start:stop] - prev_y)
+            - (prev_x - x[start:stop]) * (next_y - prev_y)
+        )
+        kept[bucket + 1] = start + np.argmax(area)
+
+    return kept
+
+
+def downsample_series(x, y, n_out=MAX_TREND_POINTS):
+    """Downsample one trend line to at most n_out points, returning (x, y)
+
+    Short lines are returned unchanged; longer ones lose their missing values
+    before downsampling.
+    """
+    x = pd.Series(x).to_numpy()
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) <= n_out:
+        return x, y
+    present = ~np.isnan(y)
+    x, y = x[present], y[present]
+    numeric_x = x.astype('datetime64[ns]').astype(np.int64) if np.issubdtype(x.dtype, np.datetime64) else x
+    kept = lttb_indices(numeric_x, y, n_out)
+    return x[kept], y[kept]
+
+
+def trend_window(trend, window=None):
+    """Return the rows of a trend DataFrame inside a (start, end) date window"""
+    if window is None:
+        return trend
+    dates = pd.to_datetime(trend['date'])
+    start, end = (pd.Timestamp(bound) for bound in window)
+    return trend[(dates >= start) & (dates <= end)]
+
+
+def score_distribution(scores, bins=SCORE_BINS):
+    """Count EWS scores (0-100) into equal-width bins, returning a DataFrame of bin start and rows"""
+    scores = np.asarray(scores, dtype=np.float64)
+    counts, edges = np.histogram(scores[~np.isnan(scores)], bins=bins, range=(0, 100))
+    return pd.DataFrame({'score': edges[:-1], 'rows': counts})
+
+
+def create_charts(status_counts, trend, window=None):
+    """Create summary charts from status counts per metric and a trend DataFrame
+
+    Long trends are downsampled to MAX_TREND_POINTS per line and drawn with
+    WebGL; window limits the trend to a (start, end) date range.
+    """
+    charts = []
+
+    # Status Distribution Chart
+    for metric, counts in status_counts.items():
+        fig = go.Figure(data=[
+            go.Bar(
+                x=counts.index,
+                y=counts.values,
+                marker_color=['green' if x == 'Green' else
+                            'yellow' if x == 'Yellow' else
+                            'orange' if x == 'Orange' else 'red'
+                            for x in counts.index]
+            )
+        ])
+        fig.update_layout(
+            title=f"{metric} Status Distribution",
+            xaxis_title="Status",
+            yaxis_title="Count",
+            showlegend=False
+        )
+        charts.append(fig)
+
+    # Trend Analysis Chart
+    if trend is not None:
+        trend = trend_window(trend, window)
+        value_cols = value_columns(trend)
+        lines = {col: downsample_series(trend['date'], trend[col], MAX_TREND_POINTS) for col in value_cols}
+        scatter = go.Scattergl if sum(len(x) for x, y in lines.values()) > WEBGL_MIN_POINTS else go.Scatter
+
+        fig = go.Figure()
+        for col, (x, y) in lines.items():
+            metric_name = col.replace('_Value', '')
+            fig.add_trace(scatter(
+                x=x,
+                y=y,
+                name=metric_name,
+                mode='lines+markers'
+            ))
+        fig.update_layout(
+            title="Metrics Trend Over Time",
+            xaxis_title="Date",
+            yaxis_title="Value (%)",
+            showlegend=True
+        )
+        charts.append(fig)
+
+    return charts
+
+
+def create_score_chart(distribution):
+    """Create a bar chart of the EWS score distribution"""
+    width = float(distribution['score'].diff().iloc[-1]) if len(distribution) > 1 else 100.0
+    fig = go.Figure(data=[
+        go.Bar(
+            x=distribution['score'] + width / 2,
+            y=distribution['rows'],
+            width=width,
+            marker_color='indianred'
+        )
+    ])
+    fig.update_layout(
+        title="EWS Score Distribution",
+        xaxis_title="EWS Score (0 all Green, 100 all Red)",
+        yaxis_title="Count",
+        showlegend=False
+    )
+    return fig
+
+
+def create_period_status_chart(rollup, granularity, col=WORST_COLUMN):
+    """Create a stacked bar chart of the status counts of one status column per period"""
+    if f'{col}_{STATUS_LABELS[0]}' not in rollup.columns:
+        col = status_columns(rollup)[0]
+    fig = go.Figure(data=[
+        go.Bar(
+            x=rollup['date'],
+            y=rollup[f'{col}_{label}'],
+            name=label,
+            marker_color=label.lower()
+        )
+        for label in STATUS_LABELS
+    ])
+    fig.update_layout(
+        title=f"{granularity} {col} Status Counts",
+        xaxis_title="Period",
+        yaxis_title="Count",
+        barmode='stack'
+    )
+    return fig
+
+
+def create_sweep_chart(counts, axes, thresholds, status='Red', target=WORST_COLUMN):
+    """Create a heatmap (two axes) or line chart (one axis) of one status count over a sweep"""
+    names = [edge_name(thresholds, axis['metric'], axis['edge']) for axis in axes]
+    values = counts[..., STATUS_LABELS.index(status)]
+    title = f"{target} {status} Count by Band Edge"
+    if len(axes) == 1:
+        fig = go.Figure(data=[
+            go.Scatter(x=axes[0]['values'], y=values[:, 0], mode='lines+markers', line_color=status.lower())
+        ])
+        fig.update_layout(title=title, xaxis_title=names[0], yaxis_title="Count", showlegend=False)
+        return fig
+
+    fig = go.Figure(data=[
+        go.Heatmap(
+            x=axes[1]['values'],
+            y=axes[0]['values'],
+            z=values,
+            colorscale='Reds',
+            colorbar={'title': "Count"}
+        )
+    ])
+    fig.update_layout(title=title, xaxis_title=names[1], yaxis_title=names[0])
+    return fig
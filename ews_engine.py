@@ -0,0 +1,925 @@
+import functools
+import json
+import os
+import tomllib
+
+import numpy as np
+import pandas as pd
+
+# Status labels ordered from best to worst
+STATUS_LABELS = ['Green', 'Yellow', 'Orange', 'Red']
+
+# Shared category table for compact status columns (int8 codes into STATUS_LABELS)
+STATUS_DTYPE = pd.CategoricalDtype(STATUS_LABELS, ordered=True)
+
+# Rule file defining the metrics, their bands and streaks, overridable with EWS_RULES_PATH
+RULES_PATH = os.environ.get('EWS_RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ews_rules.toml'))
+
+
+def validate_thresholds(thresholds):
+    """Raise ValueError if a threshold table is not ordered from best to worst band"""
+    for metric, band in thresholds.items():
+        edges = np.asarray(band['edges'], dtype=np.float64)
+        if band['direction'] not in ('min', 'max'):
+            raise ValueError(f"{metric} direction must be 'min' or 'max'")
+        if len(band['labels']) != len(edges) + 1:
+            raise ValueError(f"{metric} needs one more label than band edges")
+        steps = np.diff(edges)
+        if band['direction'] == 'max' and np.any(steps <= 0):
+            raise ValueError(f"{metric} band edges must increase")
+        if band['direction'] == 'min' and np.any(steps >= 0):
+            raise ValueError(f"{metric} band edges must decrease")
+        unknown = set(band['labels']) - set(STATUS_LABELS)
+        if unknown:
+            raise ValueError(f"{metric} has unknown status labels: {sorted(unknown)}")
+
+
+def validate_weights(weights):
+    """Raise ValueError if composite score weights are not non-negative numbers"""
+    for col, weight in weights.items():
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight < 0:
+            raise ValueError(f"{col} composite weight must be a non-negative number")
+
+
+def _band(rule):
+    """Return the band (direction, edges, labels) part of a metric or streak rule"""
+    return {'direction': rule['direction'], 'edges': list(rule['edges']), 'labels': list(rule['labels'])}
+
+
+def load_rules(path=RULES_PATH):
+    """Read and validate a rule file"""
+    with open(path, 'rb') as rules_file:
+        rules = tomllib.load(rules_file)
+
+    for metric, rule in rules['metrics'].items():
+        missing = {'numerator', 'denominator', 'direction', 'edges', 'labels'} - set(rule)
+        if missing:
+            raise ValueError(f"{metric} rule is missing {sorted(missing)}")
+    for metric in rules.get('streaks', {}):
+        if metric not in rules['metrics']:
+            raise ValueError(f"Streak rule for unknown metric {metric}")
+    validate_thresholds({metric: _band(rule) for metric, rule in rules['metrics'].items()})
+    validate_thresholds({metric: _band(rule) for metric, rule in rules.get('streaks', {}).items()})
+
+    rating = rules.get('credit_rating')
+    if rating is not None:
+        missing = {'column', 'order', 'dropped', 'statuses'} - set(rating)
+        if missing:
+            raise ValueError(f"credit_rating rule is missing {sorted(missing)}")
+        for status in [rating['dropped'], *rating['statuses'].values()]:
+            if status not in STATUS_LABELS:
+                raise ValueError(f"Unknown credit rating status {status}")
+        unmapped = set(rating['order']) - set(rating['statuses'])
+        if unmapped:
+            raise ValueError(f"Credit ratings {sorted(unmapped)} have no status")
+
+    validate_weights(rules.get('composite', {}).get('weights', {}))
+    return rules
+
+
+RULES = load_rules()
+
+# Ratio definitions: metric -> (numerator column, denominator column)
+METRIC_COLUMNS = {metric: (rule['numerator'], rule['denominator']) for metric, rule in RULES['metrics'].items()}
+
+# Numeric input columns read by the metrics
+INPUT_COLUMNS = list(dict.fromkeys(col for columns in METRIC_COLUMNS.values() for col in columns))
+
+# Band thresholds in percent, from the rule file
+DEFAULT_THRESHOLDS = {metric: _band(rule) for metric, rule in RULES['metrics'].items()}
+
+# Streak statuses by the number of consecutive Red periods
+STREAK_THRESHOLDS = {metric: _band(rule) for metric, rule in RULES.get('streaks', {}).items()}
+
+# Default length of a streak period in days
+DEFAULT_PERIOD_DAYS = {metric: rule.get('period_days', 1) for metric, rule in RULES.get('streaks', {}).items()}
+
+# Credit rating rule and input column (None when the rule file has no credit_rating table)
+RATING_RULE = RULES.get('credit_rating')
+RATING_COLUMN = RATING_RULE['column'] if RATING_RULE else None
+
+# Status column derived from the credit rating
+RATING_STATUS_COLUMN = 'Credit_Rating'
+
+# Boolean column flagging rows whose credit rating dropped from the entity's previous period
+RATING_DROPPED_COLUMN = 'Rating_Dropped'
+
+# Composite worst-of status and weighted 0-100 score columns
+WORST_COLUMN = 'Worst'
+SCORE_COLUMN = 'EWS_Score'
+
+# Composite score weight of each status column
+COMPOSITE_WEIGHTS = dict(RULES.get('composite', {}).get('weights', {}))
+
+
+def _as_float_array(values):
+    """Return a column (or a single value) as a float64 NumPy array"""
+    if isinstance(values, (pd.Series, pd.Index)):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.atleast_1d(np.asarray(values, dtype=np.float64))
+
+
+def _ratio(numerator, denominator):
+    """Calculate numerator / denominator * 100 column-wise, 0 where the denominator is 0
+
+    Returns the ratios and a mask of the zero-denominator rows.
+    """
+    num = _as_float_array(numerator)
+    den = _as_float_array(denominator)
+    ratio = np.zeros(len(num))
+    zero_denominator = den == 0
+    with np.errstate(invalid='ignore', over='ignore'):
+        np.divide(num, den, out=ratio, where=~zero_denominator)
+        ratio *= 100
+    return ratio, zero_denominator
+
+
+def compute_ratios(data):
+    """Calculate the ratio of every metric whose input columns are present
+
+    Step values scale a ratio's numerator and denominator alike, so they cancel
+    out and ratios are computed from the raw values.
+    """
+    ratios = {}
+    for metric, (numerator, denominator) in METRIC_COLUMNS.items():
+        if numerator in data and denominator in data:
+            ratios[metric] = _ratio(data[numerator], data[denominator])[0]
+    return ratios
+
+
+def thresholds_key(thresholds):
+    """Return a hashable key for a threshold table"""
+    return json.dumps(thresholds, sort_keys=True)
+
+
+def compile_band(band):
+    """Compile a band into a kernel mapping a ratio array to status codes
+
+    The edges and label codes are prepared once; each call is a single
+    binary search over the sorted edges.
+    """
+    label_codes = np.array([STATUS_LABELS.index(label) for label in band['labels']], dtype=np.int8)
+    edges = np.asarray(band['edges'], dtype=np.float64)
+    fallback = len(edges)
+
+    if band['direction'] == 'max':
+        def kernel(ratios):
+            # Number of edges strictly below the ratio
+            band_index = np.searchsorted(edges, ratios, side='left')
+            band_index[np.isnan(ratios)] = fallback
+            return label_codes[band_index]
+    else:
+        reversed_edges = edges[::-1].copy()
+
+        def kernel(ratios):
+            # Number of edges strictly above the ratio
+            band_index = fallback - np.searchsorted(reversed_edges, ratios, side='right')
+            band_index[np.isnan(ratios)] = fallback
+            return label_codes[band_index]
+
+    return kernel
+
+
+@functools.lru_cache(maxsize=32)
+def _compiled_thresholds(key):
+    return {metric: compile_band(band) for metric, band in json.loads(key).items()}
+
+
+def compile_thresholds(thresholds):
+    """Return the compiled kernel of every metric, reusing earlier compilations of the same table"""
+    return _compiled_thresholds(thresholds_key(thresholds))
+
+
+def classify(ratios, band):
+    """Return the status code (index into STATUS_LABELS) of each ratio"""
+    return compile_band(band)(np.atleast_1d(np.asarray(ratios, dtype=np.float64)))
+
+
+def status_labels(codes):
+    """Convert status codes to label strings"""
+    return np.array(STATUS_LABELS, dtype=object)[codes]
+
+
+def ratio_frame(df, entity_col=None, state=None):
+    """Calculate the *_Value columns, plus the date and entity if present, for a DataFrame
+
+    Ratios are nullable floats masked where the denominator is 0; the masked
+    slots hold 0, which is the ratio the bands are applied to. The entity
+    column is kept as a categorical. state carries each entity's last credit
+    rating between chunks (see add_rating_status).
+    """
+    columns = {}
+    for metric, (numerator, denominator) in METRIC_COLUMNS.items():
+        if numerator in df and denominator in df:
+            ratio, zero_denominator = _ratio(df[numerator], df[denominator])
+            columns[f'{metric}_Value'] = pd.arrays.FloatingArray(ratio, zero_denominator)
+
+    df_ratios = pd.DataFrame(columns, index=pd.RangeIndex(len(df)), copy=False)
+
+    if 'date' in df.columns:
+        df_ratios['date'] = df['date'].to_numpy()
+
+    if entity_col is not None and entity_col in df.columns:
+        df_ratios[entity_col] = df[entity_col].astype('category').array
+
+    if RATING_COLUMN is not None and RATING_COLUMN in df.columns:
+        add_rating_status(df_ratios, df[RATING_COLUMN], entity_col, state)
+
+    return df_ratios
+
+
+def classify_ratios(df_ratios, thresholds=None, weights=None):
+    """Build the compact results DataFrame by binning ratio columns into status bands
+
+    Only the *_Value columns are read, so changing thresholds re-bins cached
+    ratios without re-reading or re-scoring the input. Other columns (the date,
+    any entity key and the credit rating) are carried over, and the composite
+    Worst status and EWS_Score are added (see add_composite). Given a results
+    frame, its metric, composite and streak columns are dropped rather than
+    carried over, as they depend on the old bands. Statuses are categorical
+    (int8 codes into STATUS_DTYPE) and the ratio arrays are shared with
+    df_ratios; use labelled_results to get plain labels for display or export.
+    """
+    thresholds = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+    kernels = compile_thresholds(thresholds)
+    columns = {}
+
+    for metric in METRIC_COLUMNS:
+        value_col = f'{metric}_Value'
+        if value_col in df_ratios.columns:
+            ratios = df_ratios[value_col].array
+            codes = kernels[metric](ratios.to_numpy(dtype=np.float64, na_value=0.0))
+            columns[metric] = pd.Categorical.from_codes(codes, dtype=STATUS_DTYPE)
+            columns[value_col] = ratios
+
+    binned = {*METRIC_COLUMNS, WORST_COLUMN, SCORE_COLUMN}
+    for col in df_ratios.columns:
+        if col.endswith(('_Value', '_Streak', '_Streak_Periods')) or col in binned:
+            continue
+        columns[col] = df_ratios[col].array
+
+    return add_composite(pd.DataFrame(columns, index=pd.RangeIndex(len(df_ratios)), copy=False), weights)
+
+
+def add_composite(df_results, weights=None):
+    """Add the worst status across the metric and credit rating statuses, and the weighted EWS score
+
+    Worst is an elementwise max over the status codes. EWS_Score is the
+    weighted mean of the status codes of the weighted columns, scaled so all
+    Green is 0 and all Red is 100; missing statuses are left out of a row's
+    mean. Streak statuses are not included: add_streaks adds them afterwards
+    from each metric's Red periods, and with period_days > 1 every row of a
+    Red period carries the streak, even a row that is not Red itself.
+    """
+    weights = COMPOSITE_WEIGHTS if weights is None else weights
+    cols = [col for col in df_results.columns if col in METRIC_COLUMNS or col == RATING_STATUS_COLUMN]
+    if not cols:
+        return df_results
+    codes = np.stack([df_results[col].cat.codes.to_numpy() for col in cols])
+    df_results[WORST_COLUMN] = pd.Categorical.from_codes(np.maximum.reduce(codes, axis=0), dtype=STATUS_DTYPE)
+
+    weight_vector = np.array([weights.get(col, 0.0) for col in cols], dtype=np.float64)
+    if weight_vector.any():
+        # Weighted sums over the status rows; missing statuses (-1) add no weight
+        used = weight_vector > 0
+        codes = codes[used]
+        total = weight_vector[used] @ np.maximum(codes, 0).astype(np.float64)
+        weight_sum = weight_vector[used] @ (codes >= 0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            df_results[SCORE_COLUMN] = total / weight_sum * (100 / (len(STATUS_LABELS) - 1))
+    return df_results
+
+
+def labelled_results(df_results):
+    """Convert compact results to label strings and plain floats for display or export
+
+    Masked (zero-denominator) ratios become NaN.
+    """
+    columns = {}
+    for col in df_results.columns:
+        values = df_results[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        elif col.endswith('_Value'):
+            values = values.astype(np.float64)
+        columns[col] = values
+    return pd.DataFrame(columns)
+
+
+def score_frame(df, step_values=None, thresholds=None, entity_col=None, weights=None, state=None):
+    """Calculate all EWS metrics for every row of a DataFrame at once
+
+    step_values is accepted for symmetry with the UI; it does not change any ratio.
+    state carries credit ratings between chunks of the same feed.
+    """
+    return classify_ratios(ratio_frame(df, entity_col, state), thresholds, weights)
+
+
+def calculate_all_metrics(row, step_values=None, thresholds=None):
+    """Calculate all EWS metrics for a single row"""
+    thresholds = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+    results = {}
+    for metric, ratio in compute_ratios(row).items():
+        results[metric] = status_labels(classify(ratio, thresholds[metric]))[0]
+        results[f'{metric}_Value'] = float(ratio[0])
+    return results
+
+
+def _period_runs(low, periods, groups=None, base=None):
+    """Return the length of the run of consecutive low periods ending at each period
+
+    low and periods are per-period arrays sorted by (group, period); a missing
+    period or a change of group breaks a run. base optionally gives the run
+    already built up before each period, added to runs starting there.
+    """
+    index = np.arange(len(low))
+    continues = np.zeros(len(low), dtype=bool)
+    continues[1:] = low[:-1] & (periods[1:] == periods[:-1] + 1)
+    if groups is not None:
+        continues[1:] &= groups[1:] == groups[:-1]
+    run_starts = low & ~continues
+    last_start = np.maximum.accumulate(np.where(run_starts, index, -1))
+    runs = index - last_start + 1
+    if base is not None:
+        runs = runs + base[np.maximum(last_start, 0)]
+    return np.where(low, runs, 0)
+
+
+def new_carry(groups=0):
+    """Create the run state carried between chunks for a number of groups
+
+    Every array has one entry per group code plus a last entry for rows
+    without a group (code -1): each group's last period, whether it was low
+    and the run of low periods before it.
+    """
+    return {
+        'periods': np.full(groups + 1, np.iinfo(np.int64).min // 2, dtype=np.int64),
+        'low': np.zeros(groups + 1, dtype=bool),
+        'before': np.zeros(groups + 1, dtype=np.int64)
+    }
+
+
+def _carry_runs(carry, period_low, periods, groups, dated):
+    """Continue runs from the carried state and return the base run of each period
+
+    A group's first period continues the carried run if it is the carried
+    period itself (whose rows are then low if any earlier row was) or the one
+    right after it; without dates every chunk follows on from the last.
+    """
+    codes = groups if groups is not None else np.zeros(len(periods), dtype=np.int64)
+    first = np.r_[True, codes[1:] != codes[:-1]]
+    carried_periods = carry['periods'][codes]
+    carried_before = carry['before'][codes]
+    carried_low = carry['low'][codes]
+    base = np.zeros(len(periods), dtype=np.int64)
+    if dated:
+        same = first & (periods == carried_periods)
+        period_low[same] |= carried_low[same]
+        base[same] = carried_before[same]
+        following = first & (periods == carried_periods + 1)
+    else:
+        following = first
+    base[following] = np.where(carried_low[following], carried_before[following] + 1, 0)
+    return base
+
+
+def _update_carry(carry, period_low, periods, groups, base, runs):
+    """Store the last period of each group, its lowness and the run before it"""
+    codes = groups if groups is not None else np.zeros(len(periods), dtype=np.int64)
+    first = np.r_[True, codes[1:] != codes[:-1]]
+    last = np.r_[codes[1:] != codes[:-1], True]
+    # Run ending at the period before each one: carried in for a group's first period
+    follows = np.zeros(len(periods), dtype=bool)
+    follows[1:] = ~first[1:] & (periods[1:] == periods[:-1] + 1)
+    before = np.where(first, base, 0)
+    before[follows] = runs[np.flatnonzero(follows) - 1]
+    carry['periods'][codes[last]] = periods[last]
+    carry['low'][codes[last]] = period_low[last]
+    carry['before'][codes[last]] = before[last]
+
+
+def low_period_runs(low, dates=None, period_days=1, groups=None, origin=None, carry=None):
+    """Return, for each row, the run of consecutive low periods up to and including its own
+
+    Rows are bucketed into periods of period_days days counted from origin
+    (the first date by default); a period is low if any of its rows is.
+    Without dates each row is a period. Rows without a date get a run of 0.
+    If groups (integer codes, such as a borrower) are given, runs are counted
+    separately within each group. carry (see new_carry) continues the runs of
+    an earlier chunk of rows and is updated with this chunk's last periods;
+    chunks must follow on in date order per group, with a fixed origin.
+    """
+    low = np.asarray(low, dtype=bool)
+    runs = np.zeros(len(low), dtype=np.int32)
+
+    if dates is None:
+        order = np.arange(len(low))
+        if groups is not None:
+            order = np.argsort(groups, kind='stable')
+        periods = np.arange(len(order))
+    else:
+        days = np.asarray(dates, dtype='datetime64[D]')
+        order = np.flatnonzero(~np.isnat(days))
+        if groups is not None:
+            order = order[np.lexsort((days[order], groups[order]))]
+        else:
+            order = order[np.argsort(days[order], kind='stable')]
+        days = days[order].astype(np.int64)
+        if origin is not None:
+            first_day = np.datetime64(origin, 'D').astype(np.int64)
+        else:
+            first_day = days.min() if len(days) else 0
+        periods = (days - first_day) // period_days
+    if len(order) == 0:
+        return runs
+
+    # One entry per (group, period), then spread the period runs back over its rows
+    changes = periods[1:] != periods[:-1]
+    if groups is not None:
+        groups = np.asarray(groups)[order]
+        changes |= groups[1:] != groups[:-1]
+    starts = np.flatnonzero(np.r_[True, changes])
+    period_low = np.logical_or.reduceat(low[order], starts)
+    period_groups = groups[starts] if groups is not None else None
+    base = None
+    if carry is not None:
+        base = _carry_runs(carry, period_low, periods[starts], period_groups, dates is not None)
+    period_runs = _period_runs(period_low, periods[starts], period_groups, base)
+    if carry is not None:
+        _update_carry(carry, period_low, periods[starts], period_groups, base, period_runs)
+    runs[order] = np.repeat(period_runs, np.diff(np.r_[starts, len(order)]))
+    return runs
+
+
+def _carried(state, key, labels):
+    """Return the carry of a metric for this chunk's group labels, from the per-label state"""
+    carry = new_carry(len(labels) - 1)
+    known = state.get(key)
+    if known is not None:
+        found = known.reindex(labels)
+        present = found['periods'].notna().to_numpy()
+        for name in carry:
+            carry[name][present] = found[name].to_numpy()[present].astype(carry[name].dtype)
+    return carry
+
+
+def _merge_state(state, key, chunk):
+    """Update the per-label state of key with a chunk's entries (a frame or series indexed by label)"""
+    known = state.get(key)
+    state[key] = chunk if known is None else pd.concat([known[~known.index.isin(chunk.index)], chunk])
+
+
+def _store_carried(state, key, carry, labels):
+    """Merge a chunk's carry back into the per-label state"""
+    seen = carry['periods'] != np.iinfo(np.int64).min // 2
+    _merge_state(state, key, pd.DataFrame({name: values[seen] for name, values in carry.items()}, index=labels[seen]))
+
+
+def _group_labels(df_results, entity_col):
+    """Return the entity codes of a frame and the labels of codes 0..n-1 followed by a missing slot"""
+    groups = entity_codes(df_results, entity_col)
+    if groups is None:
+        return None, pd.Index([None], dtype=object)
+    values = df_results[entity_col]
+    categories = values.cat.categories if isinstance(values.dtype, pd.CategoricalDtype) else pd.factorize(values)[1]
+    return groups, pd.Index(list(categories.astype(str)) + [None], dtype=object)
+
+
+def add_streaks(df_results, period_days=None, entity_col=None, origin=None, state=None):
+    """Add consecutive Red period runs and their escalated streak status for PVR and CLR
+
+    Adds <metric>_Streak_Periods (run length in periods) and <metric>_Streak
+    (status from STREAK_THRESHOLDS) for each metric in period_days. With an
+    entity column, runs are counted per entity. state (a dict) carries the
+    runs from one chunk of rows to the next, keyed by entity; rows of each
+    entity must then arrive in date order across chunks, and rows of a
+    period split across chunks only count the rows before them.
+    """
+    period_days = DEFAULT_PERIOD_DAYS if period_days is None else period_days
+    dates = df_results['date'].to_numpy() if 'date' in df_results.columns else None
+    groups = entity_codes(df_results, entity_col)
+    labels = None
+    if state is not None:
+        groups, labels = _group_labels(df_results, entity_col)
+        first_date = pd.Series(dates).min() if dates is not None else None
+        if origin is None and pd.notna(first_date):
+            # Periods of every chunk are counted from the first chunk's first date
+            origin = state.setdefault('origin', first_date)
+
+    for metric, days in period_days.items():
+        if metric in df_results.columns:
+            red = df_results[metric].cat.codes.to_numpy() == STATUS_LABELS.index('Red')
+            carry = None if state is None else _carried(state, metric, labels)
+            runs = low_period_runs(red, dates, days, groups, origin, carry)
+            if carry is not None:
+                _store_carried(state, metric, carry, labels)
+            df_results[f'{metric}_Streak_Periods'] = runs
+            df_results[f'{metric}_Streak'] = pd.Categorical.from_codes(
+                classify(runs.astype(np.float64), STREAK_THRESHOLDS[metric]),
+                dtype=STATUS_DTYPE
+            )
+
+    return df_results
+
+
+def _in_period_order(dates, groups):
+    """Return whether rows are already ordered by group, then date"""
+    if dates is None and groups is None:
+        return True
+    rows = len(dates) if dates is not None else len(groups)
+    if groups is None:
+        new_group = np.zeros(max(rows - 1, 0), dtype=bool)
+        same_group = ~new_group
+    else:
+        new_group = groups[1:] > groups[:-1]
+        same_group = groups[1:] == groups[:-1]
+    if dates is None:
+        return bool(np.all(new_group | same_group))
+    return bool(np.all(new_group | (same_group & (dates[1:] >= dates[:-1]))))
+
+
+def rating_status(ratings, groups=None, dates=None, rule=None, carry=None):
+    """Map credit ratings to status codes in one lookup, and flag the ratings that dropped
+
+    A rating worse (later in the rule's order) than the same entity's previous
+    period is flagged as dropped and gets at least the rule's dropped status.
+    Unknown or missing ratings get code -1 (no status). carry, an array of
+    each group's last rating rank from an earlier chunk (indexed by group
+    code, the last entry serving rows without a group, -1 for none), is
+    compared with each group's first row and updated with its last. Returns
+    the status codes and the boolean dropped flags, in row order.
+    """
+    rule = RATING_RULE if rule is None else rule
+    ratings = pd.Series(ratings).astype('category').array
+    categories = list(ratings.categories)
+    codes = ratings.codes
+
+    # Per-category lookup tables; the extra last entry serves code -1 (missing)
+    status_lookup = np.array(
+        [STATUS_LABELS.index(rule['statuses'][cat]) if cat in rule['statuses'] else -1 for cat in categories] + [-1],
+        dtype=np.int8
+    )
+    rank_lookup = np.array([rule['order'].index(cat) if cat in rule['order'] else -1 for cat in categories] + [-1])
+    status = status_lookup[codes]
+    rank = rank_lookup[codes]
+
+    # Compare each row with the previous period of the same entity
+    order = None
+    if not _in_period_order(dates, groups):
+        keys = ([dates] if dates is not None else []) + ([groups] if groups is not None else [])
+        order = np.lexsort(keys)
+        rank = rank[order]
+        groups = groups[order] if groups is not None else None
+    dropped = (rank[1:] > rank[:-1]) & (rank[:-1] >= 0)
+    if groups is not None:
+        dropped &= groups[1:] == groups[:-1]
+    dropped = np.r_[False, dropped]
+    if carry is not None and len(rank):
+        codes = groups if groups is not None else np.zeros(len(rank), dtype=np.int64)
+        first = np.r_[True, codes[1:] != codes[:-1]]
+        last = np.r_[codes[1:] != codes[:-1], True]
+        previous = carry[codes[first]]
+        dropped[first] = (rank[first] > previous) & (previous >= 0)
+        carry[codes[last]] = rank[last]
+    dropped_rows = np.flatnonzero(dropped)
+    if order is not None:
+        dropped_rows = order[dropped_rows]
+    status[dropped_rows] = np.maximum(status[dropped_rows], STATUS_LABELS.index(rule['dropped']))
+    dropped = np.zeros(len(status), dtype=bool)
+    dropped[dropped_rows] = True
+    return status, dropped
+
+
+def add_rating_status(df_out, ratings, entity_col=None, state=None):
+    """Add the credit rating (as a categorical), its Credit_Rating status and its Rating_Dropped flag
+
+    state (a dict) carries each entity's last rating from one chunk of rows
+    to the next, so a drop across a chunk boundary is still flagged.
+    """
+    ratings = pd.Series(ratings).astype('category').array
+    df_out[RATING_COLUMN] = ratings
+    dates = df_out['date'].to_numpy() if 'date' in df_out.columns else None
+    groups = entity_codes(df_out, entity_col)
+    carry = None
+    if state is not None:
+        groups, labels = _group_labels(df_out, entity_col)
+        carry = np.full(len(labels), -1, dtype=np.int64)
+        known = state.get('rating')
+        if known is not None:
+            carry = known.reindex(labels).fillna(-1).to_numpy(dtype=np.int64)
+    codes, dropped = rating_status(ratings, groups, dates, carry=carry)
+    if carry is not None:
+        seen = np.unique(groups) if groups is not None else np.array([0])
+        _merge_state(state, 'rating', pd.Series(carry[seen], index=labels[seen]))
+    df_out[RATING_STATUS_COLUMN] = pd.Categorical.from_codes(codes, dtype=STATUS_DTYPE)
+    df_out[RATING_DROPPED_COLUMN] = dropped
+    return df_out
+
+
+def streak_status(metric, periods):
+    """Return the streak status for a number of consecutive low periods"""
+    return status_labels(classify(np.array([periods], dtype=np.float64), STREAK_THRESHOLDS[metric]))[0]
+
+
+def entity_codes(df_results, entity_col):
+    """Return integer codes of the entity column, or None without one"""
+    if entity_col is None or entity_col not in df_results.columns:
+        return None
+    values = df_results[entity_col]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy()
+    return pd.factorize(values)[0]
+
+
+def streak_summary(df_results, entity_col=None):
+    """Return the current (latest date) and longest run of Red periods per metric
+
+    With an entity column the current run is the longest among each entity's
+    latest rows.
+    """
+    summary = {}
+    groups = entity_codes(df_results, entity_col)
+    for col in df_results.columns:
+        if col.endswith('_Streak_Periods'):
+            runs = df_results[col].to_numpy()
+            if len(runs) == 0:
+                continue
+            if groups is not None:
+                dates = df_results['date'] if 'date' in df_results.columns else pd.Series(np.arange(len(runs)))
+                latest = dates.groupby(groups).transform('max').to_numpy()
+                current = int(runs[dates.to_numpy() == latest].max())
+            elif 'date' in df_results.columns:
+                dates = df_results['date'].to_numpy()
+                current = int(runs[dates == dates.max()].max())
+            else:
+                current = int(runs[-1])
+            summary[col[:-len('_Streak_Periods')]] = {'current': current, 'max': int(runs.max())}
+    return summary
+
+
+def top_risk(df_results, n=20):
+    """Return the n riskiest rows, worst status first and then highest EWS score
+
+    The rows are picked with a partial selection (argpartition), so only
+    those n rows are sorted.
+    """
+    if WORST_COLUMN not in df_results.columns or len(df_results) == 0 or n < 1:
+        return df_results.iloc[:0]
+    key = df_results[WORST_COLUMN].cat.codes.to_numpy().astype(np.float64) * 1000
+    if SCORE_COLUMN in df_results.columns:
+        key += np.nan_to_num(df_results[SCORE_COLUMN].to_numpy(), nan=0.0)
+    n = min(n, len(key))
+    picked = np.argpartition(-key, n - 1)[:n] if n < len(key) else np.arange(len(key))
+    picked = picked[np.argsort(-key[picked], kind='stable')]
+    return df_results.take(picked)
+
+
+def status_columns(df_results):
+    """Return the status columns of a compact results DataFrame"""
+    return [col for col in df_results.columns if df_results[col].dtype == STATUS_DTYPE]
+
+
+def value_columns(df_results):
+    """Return the ratio value columns of a results DataFrame"""
+    return [col for col in df_results.columns if col.endswith('_Value')]
+
+
+def count_statuses(statuses):
+    """Count the statuses present in a status column, most frequent first"""
+    counts = statuses.value_counts()
+    counts = counts[counts > 0]
+    counts.index = counts.index.astype(object)
+    return counts
+
+
+def new_summary():
+    """Create an empty running summary of scored results"""
+    return {
+        'rows': 0,
+        'status_counts': {},
+        'trend_sums': None,
+        'trend_counts': None,
+        'daily': None
+    }
+
+
+def _add_frames(total, part):
+    """Add two count/sum frames or series aligned on their index"""
+    if total is None:
+        return part
+    if part is None:
+        return total
+    return total.add(part, fill_value=0)
+
+
+def update_summary(summary, df_results):
+    """Fold a chunk of scored results into a running summary"""
+    summary['rows'] += len(df_results)
+
+    # Status counts
+    for metric in status_columns(df_results):
+        counts = count_statuses(df_results[metric])
+        summary['status_counts'][metric] = _add_frames(summary['status_counts'].get(metric), counts)
+
+    # Trend aggregates (per-date sums and counts of each ratio)
+    value_cols = value_columns(df_results)
+    if 'date' in df_results.columns and value_cols:
+        grouped = df_results.groupby('date')[value_cols]
+        summary['trend_sums'] = _add_frames(summary['trend_sums'], grouped.sum())
+        summary['trend_counts'] = _add_frames(summary['trend_counts'], grouped.count())
+
+    return summary
+
+
+def merge_summaries(left, right):
+    """Combine two running summaries into a new one"""
+    merged = new_summary()
+    merged['rows'] = left['rows'] + right['rows']
+    for metric in dict.fromkeys([*left['status_counts'], *right['status_counts']]):
+        merged['status_counts'][metric] = _add_frames(
+            left['status_counts'].get(metric),
+            right['status_counts'].get(metric)
+        )
+    merged['trend_sums'] = _add_frames(left['trend_sums'], right['trend_sums'])
+    merged['trend_counts'] = _add_frames(left['trend_counts'], right['trend_counts'])
+    merged['daily'] = _add_frames(left.get('daily'), right.get('daily'))
+    return merged
+
+
+def summary_status_counts(summary):
+    """Return the status counts of a running summary, most frequent first"""
+    return {
+        metric: counts.astype('int64').sort_values(ascending=False, kind='stable')
+        for metric, counts in summary['status_counts'].items()
+    }
+
+
+def summary_trend(summary):
+    """Return the per-date mean of each ratio from a running summary"""
+    if summary['trend_sums'] is None:
+        return None
+    trend = summary['trend_sums'] / summary['trend_counts']
+    return trend.sort_index().rename_axis('date').reset_index()
+
+
+def _day_numbers(dates):
+    """Return dates as int64 days since the epoch, with the int64 minimum for missing ones"""
+    return np.asarray(dates).astype('datetime64[ns]').astype('datetime64[D]').view(np.int64)
+
+
+def daily_totals(inputs, df_results):
+    """Sum every metric's numerator and denominator and count every status and rating drop per date, in one grouped pass
+
+    inputs is the scored input DataFrame or Arrow table; its rows need not be
+    in the order of df_results, as each is grouped by its own dates. Rows
+    where a numerator or denominator is missing are left out of that metric's
+    sums. The frame is indexed by date and its columns are all sums, so
+    totals of chunks can be added together. Returns None without dates.
+    """
+    input_names = getattr(inputs, 'column_names', None) or list(inputs.columns)
+    if 'date' not in df_results.columns or 'date' not in input_names:
+        return None
+    missing = np.iinfo(np.int64).min
+    input_days = _day_numbers(inputs['date'])
+    result_days = _day_numbers(df_results['date'].to_numpy())
+    dated = np.concatenate([input_days, result_days])
+    dated = dated[dated != missing]
+    if not len(dated):
+        return None
+
+    # Days are bucketed by their offset from the first day, without sorting;
+    # rows left out (undated, or with a missing value) go to an extra last bucket
+    first = dated.min()
+    span = int(dated.max() - first) + 1
+    input_offsets = np.where(input_days != missing, input_days - first, span)
+    result_offsets = np.where(result_days != missing, result_days - first, span)
+    columns = {'Rows': np.bincount(result_offsets, minlength=span + 1)}
+    input_rows = np.bincount(input_offsets, minlength=span + 1)
+
+    for metric, (numerator, denominator) in METRIC_COLUMNS.items():
+        if numerator in input_names and denominator in input_names:
+            num = _as_float_array(inputs[numerator])
+            den = _as_float_array(inputs[denominator])
+            offsets = np.where(np.isnan(num) | np.isnan(den), span, input_offsets)
+            columns[f'{metric}_Numerator'] = np.bincount(offsets, num, minlength=span + 1)
+            columns[f'{metric}_Denominator'] = np.bincount(offsets, den, minlength=span + 1)
+
+    if RATING_DROPPED_COLUMN in df_results.columns:
+        dropped = df_results[RATING_DROPPED_COLUMN].to_numpy(dtype=np.float64)
+        columns[RATING_DROPPED_COLUMN] = np.bincount(result_offsets, dropped, minlength=span + 1).astype(np.int64)
+
+    labels = len(STATUS_LABELS)
+    for col in status_columns(df_results):
+        codes = df_results[col].cat.codes.to_numpy()
+        keys = np.where(codes >= 0, result_offsets * labels + codes, span * labels)
+        counts = np.bincount(keys, minlength=(span + 1) * labels).reshape(span + 1, labels)
+        for i, label in enumerate(STATUS_LABELS):
+            columns[f'{col}_{label}'] = counts[:, i]
+
+    # Keep only the days that have rows
+    kept = np.flatnonzero((columns['Rows'][:span] > 0) | (input_rows[:span] > 0))
+    days = (first + kept).astype('datetime64[D]').astype('datetime64[ns]')
+    return pd.DataFrame(
+        {col: values[kept] for col, values in columns.items()}, index=pd.DatetimeIndex(days, name='date')
+    )
+
+
+# Calendar periods of the rollups, as pandas period frequencies
+ROLLUP_PERIODS = {'Daily': 'D', 'Weekly': 'W', 'Monthly': 'M', 'Quarterly': 'Q'}
+
+
+def period_rollup(daily, freq):
+    """Roll daily totals up to calendar periods of a pandas frequency ('W', 'M', 'Q', ...)
+
+    Each period gets its row count, every metric's ratio of summed numerators
+    to summed denominators (NaN when the denominators sum to 0), the number
+    of credit rating drops, the worst status of each status column and the
+    status counts. Periods are labelled by their first day.
+    """
+    totals = daily.groupby(daily.index.to_period(freq).start_time).sum()
+    rollup = pd.DataFrame({'Rows': totals['Rows'].to_numpy()}, index=totals.index)
+    if RATING_DROPPED_COLUMN in totals.columns:
+        rollup[RATING_DROPPED_COLUMN] = totals[RATING_DROPPED_COLUMN].to_numpy()
+    for metric in METRIC_COLUMNS:
+        if f'{metric}_Numerator' in totals.columns:
+            num = totals[f'{metric}_Numerator'].to_numpy()
+            den = totals[f'{metric}_Denominator'].to_numpy()
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rollup[f'{metric}_Value'] = np.where(den != 0, num / den * 100, np.nan)
+
+    count_cols = [col for col in totals.columns if col.endswith(f'_{STATUS_LABELS[0]}')]
+    status_cols = [col[:-len(STATUS_LABELS[0]) - 1] for col in count_cols]
+    for col in status_cols:
+        present = totals[[f'{col}_{label}' for label in STATUS_LABELS]].to_numpy() > 0
+        # Highest present status code, or -1 for a period without statuses
+        worst = np.where(present.any(axis=1), len(STATUS_LABELS) - 1 - np.argmax(present[:, ::-1], axis=1), -1)
+        rollup[col] = pd.Categorical.from_codes(worst, dtype=STATUS_DTYPE)
+    for col in status_cols:
+        for label in STATUS_LABELS:
+            rollup[f'{col}_{label}'] = totals[f'{col}_{label}'].to_numpy()
+    return rollup.rename_axis('date').reset_index()
+
+
+def period_rollups(daily):
+    """Return the rollup of daily totals at every ROLLUP_PERIODS granularity, or None without totals"""
+    if daily is None:
+        return None
+    return {name: period_rollup(daily, freq) for name, freq in ROLLUP_PERIODS.items()}
+
+
+def score_chunks(chunks, step_values=None, output_path=None, thresholds=None, weights=None, period_days=None,
+                 entity_col=None):
+    """Score DataFrame chunks one at a time and fold them into a running summary
+
+    When output_path is given the per-row results of each chunk are appended to
+    it as CSV, so only one chunk is held in memory at a time. The summary also
+    holds the chunks' daily totals for the period rollups. With the entity
+    column, each entity is scored separately and its results keep the key.
+    Red period runs and the last credit rating of each entity are carried
+    from chunk to chunk, which needs every entity's rows in date order; the
+    summary's 'unordered' counts entities whose dates went back from one
+    chunk to the next, and its 'streaks' has the current and longest run of
+    each streak metric.
+    """
+    summary = new_summary()
+    summary['unordered'] = 0
+    state = {}
+    last_dates = None
+    longest = {}
+    first_chunk = True
+
+    for chunk in chunks:
+        grouped = entity_col if entity_col is not None and entity_col in chunk.columns else None
+        df_results = score_frame(chunk, step_values, thresholds, grouped, weights, state)
+        df_results = add_streaks(df_results, period_days, grouped, state=state)
+        if 'date' in df_results.columns and len(df_results):
+            # Entities whose dates go back across chunks break the carried state
+            keys = df_results[grouped].astype(str) if grouped else pd.Series('', index=df_results.index)
+            dates = df_results['date'].groupby(keys.to_numpy())
+            first_dates, latest = dates.min(), dates.max()
+            if last_dates is not None:
+                summary['unordered'] += int((first_dates < last_dates.reindex(first_dates.index)).sum())
+                latest = pd.concat([last_dates, latest]).groupby(level=0).max()
+            last_dates = latest
+        update_summary(summary, df_results)
+        summary['daily'] = _add_frames(summary['daily'], daily_totals(chunk, df_results))
+        for col in df_results.columns:
+            if col.endswith('_Streak_Periods') and len(df_results):
+                metric = col[:-len('_Streak_Periods')]
+                longest[metric] = max(longest.get(metric, 0), int(df_results[col].max()))
+        if output_path is not None:
+            df_results.to_csv(
+                output_path,
+                mode='w' if first_chunk else 'a',
+                header=first_chunk,
+                index=False
+            )
+        first_chunk = False
+
+    # The current run is the run at the last period seen
+    summary['streaks'] = {}
+    for metric, runs in longest.items():
+        carried = state[metric]
+        current = np.where(carried['low'].to_numpy(), carried['before'].to_numpy() + 1, 0)
+        summary['streaks'][metric] = {'current': int(current.max()) if len(current) else 0, 'max': runs}
+    return summary
@@ -0,0 +1,209 @@
+"""Export scored EWS results to Excel, gzip CSV or Parquet with bounded memory"""
+import io
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import Rule
+from openpyxl.styles import Font, PatternFill
+from openpyxl.styles.differential import DifferentialStyle
+from openpyxl.utils import get_column_letter
+
+from ews_engine import (
+    METRIC_COLUMNS,
+    RATING_COLUMN,
+    RATING_STATUS_COLUMN,
+    STATUS_LABELS,
+    WORST_COLUMN,
+    labelled_results,
+    status_columns
+)
+
+# Rows per Excel sheet, including the header row
+EXCEL_MAX_ROWS = 1_048_576
+
+# Rows converted and written at a time
+EXPORT_CHUNK_ROWS = 100_000
+
+# Status colour fills, as in create_ews_template.py
+STATUS_FILLS = {
+    'Green': '90EE90',
+    'Yellow': 'FFFFE0',
+    'Orange': 'FFD700',
+    'Red': 'FFB6C6'
+}
+
+# Export format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv.gz': ('csv.gz', 'application/gzip'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'csv': ('csv', 'text/csv')
+}
+
+
+def iter_frame_chunks(df_results, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield a results DataFrame in slices of chunk_rows rows"""
+    for start in range(0, len(df_results), chunk_rows):
+        yield df_results.iloc[start:start + chunk_rows]
+
+
+def iter_results_csv(path, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield chunks of a results CSV written in streaming mode
+
+    Status and credit rating columns are read as strings, so a chunk where
+    one is empty does not read it as floats.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = {col: 'float64' for col in header if col.endswith('_Value')}
+    labels = [*METRIC_COLUMNS, WORST_COLUMN, RATING_STATUS_COLUMN, RATING_COLUMN]
+    dtypes.update({col: str for col in header if col in labels or col.endswith('_Streak')})
+    parse_dates = ['date'] if 'date' in header else False
+    yield from pd.read_csv(path, chunksize=chunk_rows, dtype=dtypes, parse_dates=parse_dates)
+
+
+def _status_rules(worksheet, status_cols, last_row):
+    """Colour status cells with the template's conditional formatting rules"""
+    for col in status_cols:
+        col_letter = get_column_letter(col)
+        status_range = f"{col_letter}2:{col_letter}{last_row}"
+        for status in STATUS_LABELS:
+            color = STATUS_FILLS[status]
+            rule = Rule(
+                type="containsText",
+                operator="containsText",
+                text=status,
+                dxf=DifferentialStyle(fill=PatternFill(start_color=color, end_color=color, fill_type="solid"))
+            )
+            rule.formula = [f'NOT(ISERROR(SEARCH("{status}",{col_letter}2)))']
+            worksheet.conditional_formatting.add(status_range, rule)
+
+
+def _sheet_rows(chunk):
+    """Convert a labelled chunk into rows of plain Python values for openpyxl"""
+    columns = []
+    for col in chunk.columns:
+        values = chunk[col].astype(object).to_numpy()
+        values[pd.isna(values)] = None
+        columns.append(values)
+    return zip(*columns)
+
+
+def write_excel(chunks, target, sheet_rows=EXCEL_MAX_ROWS):
+    """Stream result chunks into a write-only workbook
+
+    Rows beyond the sheet limit continue on "Results 2", "Results 3" and so
+    on, each with its own header. Status columns get the template colour
+    fills through conditional formatting, so no per-cell styles are held.
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = None
+    columns = None
+    status_cols = []
+    sheet_count = 0
+    row_count = 0
+
+    def finish_sheet():
+        if worksheet is not None and row_count > 1:
+            _status_rules(worksheet, status_cols, row_count)
+
+    for chunk in chunks:
+        if columns is None:
+            columns = list(chunk.columns)
+            status_cols = [columns.index(col) + 1 for col in _export_status_columns(chunk)]
+        chunk = labelled_results(chunk)
+
+        for row in _sheet_rows(chunk):
+            if worksheet is None or row_count >= sheet_rows:
+                finish_sheet()
+                sheet_count += 1
+                worksheet = workbook.create_sheet("Results" if sheet_count == 1 else f"Results {sheet_count}")
+                worksheet.append([_header_cell(worksheet, col) for col in columns])
+                row_count = 1
+            worksheet.append(row)
+            row_count += 1
+
+    if worksheet is None:
+        worksheet = workbook.create_sheet("Results")
+        if columns:
+            worksheet.append(columns)
+    finish_sheet()
+    workbook.save(target)
+
+
+def _export_status_columns(chunk):
+    """Return the status columns of compact results or of a streamed results CSV chunk"""
+    columns = status_columns(chunk)
+    for col in chunk.columns:
+        values = chunk[col]
+        if col not in columns and values.dtype == object and values.notna().any():
+            if values.dropna().isin(STATUS_LABELS).all():
+                columns.append(col)
+    return columns
+
+
+def _header_cell(worksheet, value):
+    """Return a bold header cell for a write-only worksheet"""
+    cell = WriteOnlyCell(worksheet, value=value)
+    cell.font = Font(bold=True)
+    return cell
+
+
+def write_csv(chunks, target, compression=None):
+    """Write result chunks as (optionally gzip-compressed) CSV"""
+    first_chunk = True
+    for chunk in chunks:
+        chunk.to_csv(
+            target,
+            mode='wb' if first_chunk else 'ab',
+            header=first_chunk,
+            index=False,
+            compression=compression
+        )
+        first_chunk = False
+
+
+def write_parquet(chunks, target):
+    """Write result chunks as row groups of one Parquet file
+
+    The file schema is the first chunk's, with columns that are all null
+    there (such as a credit rating missing from the first rows) widened to
+    strings, the type of every label column.
+    """
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(labelled_results(chunk), preserve_index=False)
+            if writer is None:
+                schema = pa.schema(
+                    [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema],
+                    metadata=table.schema.metadata
+                )
+                writer = pq.ParquetWriter(target, schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_export(chunks, target, export_format):
+    """Write result chunks to a path or binary file in one of EXPORT_FORMATS"""
+    if export_format == 'xlsx':
+        write_excel(chunks, target)
+    elif export_format == 'csv.gz':
+        write_csv(chunks, target, {'method': 'gzip', 'mtime': 0})
+    elif export_format == 'csv':
+        write_csv(chunks, target)
+    elif export_format == 'parquet':
+        write_parquet(chunks, target)
+    else:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+
+def export_bytes(chunks, export_format):
+    """Build an export in memory and return its bytes"""
+    output = io.BytesIO()
+    write_export(chunks, output, export_format)
+    return output.getvalue()
@@ -0,0 +1,154 @@
+"""Per-entity (borrower) scoring, rollups and sharded parallel evaluation"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ews_engine import (
+    RATING_DROPPED_COLUMN,
+    SCORE_COLUMN,
+    STATUS_DTYPE,
+    STATUS_LABELS,
+    WORST_COLUMN,
+    add_streaks,
+    score_frame,
+    status_columns
+)
+
+# Default entity key column of multi-borrower feeds
+DEFAULT_ENTITY_COLUMN = 'borrower_id'
+
+# Frames smaller than this are scored in the calling process
+PARALLEL_MIN_ROWS = 1_000_000
+
+
+def sort_by_entity(df, entity_col):
+    """Return df ordered by entity then date, with the entity as a categorical"""
+    df = df.assign(**{entity_col: df[entity_col].astype('category')})
+    keys = [df['date'].to_numpy()] if 'date' in df.columns else []
+    order = np.lexsort(keys + [df[entity_col].cat.codes.to_numpy()])
+    return df.take(order).reset_index(drop=True)
+
+
+def entity_shards(entity_codes, shards):
+    """Split rows sorted by entity into contiguous slices of similar size
+
+    Slices only break at entity boundaries, so every entity is scored whole.
+    """
+    starts = np.flatnonzero(np.r_[True, entity_codes[1:] != entity_codes[:-1]])
+    targets = np.arange(1, shards) * len(entity_codes) / shards
+    cuts = starts[np.minimum(np.searchsorted(starts, targets), len(starts) - 1)] if len(starts) else []
+    bounds = np.unique(np.r_[0, cuts, len(entity_codes)])
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def _score_shard(df, entity_col, thresholds, period_days, origin):
+    """Score one shard of whole entities and add their streaks"""
+    df_results = score_frame(df, thresholds=thresholds, entity_col=entity_col)
+    return add_streaks(df_results, period_days, entity_col, origin)
+
+
+def score_grouped(df, entity_col, step_values=None, thresholds=None, period_days=None, workers=None):
+    """Score a multi-entity DataFrame in entity and date order
+
+    Streaks are counted per entity. Frames of at least PARALLEL_MIN_ROWS rows
+    are split into shards of whole entities and scored across worker processes
+    (os.cpu_count() by default).
+    """
+    df = sort_by_entity(df, entity_col)
+    origin = df['date'].min() if 'date' in df.columns else None
+    origin = None if pd.isna(origin) else origin
+    workers = os.cpu_count() if workers is None else workers
+
+    if workers <= 1 or len(df) < PARALLEL_MIN_ROWS:
+        return _score_shard(df, entity_col, thresholds, period_days, origin)
+
+    shards = entity_shards(df[entity_col].cat.codes.to_numpy(), workers)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+        futures = [
+            executor.submit(_score_shard, df.iloc[shard], entity_col, thresholds, period_days, origin)
+            for shard in shards
+        ]
+        parts = [future.result() for future in futures]
+
+    return pd.concat(parts, ignore_index=True)
+
+
+def entity_rollup(df_results, entity_col):
+    """Build one row per entity with its worst status per metric, for an analyst queue
+
+    Columns: Rows, Last_Date, the worst status of each metric, Worst (across
+    metrics), Red_Rows (rows with any Red status), Rating_Dropped (the number
+    of credit rating drops), Max_EWS_Score and the current streak run of each
+    streak metric. Sorted worst first.
+    """
+    metrics = [col for col in status_columns(df_results) if not col.endswith('_Streak') and col != WORST_COLUMN]
+    entities = df_results[entity_col]
+    if not isinstance(entities.dtype, pd.CategoricalDtype):
+        entities = entities.astype('category')
+    grouped_by = entities.cat.codes.to_numpy()
+
+    codes = pd.DataFrame({metric: df_results[metric].cat.codes.to_numpy() for metric in metrics})
+    grouped = codes.groupby(grouped_by)
+    worst = grouped.max()
+    red = STATUS_LABELS.index('Red')
+
+    rollup = pd.DataFrame({'Rows': grouped.size()})
+    if 'date' in df_results.columns:
+        rollup['Last_Date'] = df_results['date'].groupby(grouped_by).max()
+    for metric in metrics:
+        rollup[metric] = pd.Categorical.from_codes(worst[metric].to_numpy(), dtype=STATUS_DTYPE)
+    rollup['Worst'] = pd.Categorical.from_codes(worst.max(axis=1).to_numpy(), dtype=STATUS_DTYPE)
+    rollup['Red_Rows'] = (codes == red).any(axis=1).groupby(grouped_by).sum()
+    if RATING_DROPPED_COLUMN in df_results.columns:
+        rollup[RATING_DROPPED_COLUMN] = df_results[RATING_DROPPED_COLUMN].groupby(grouped_by).sum()
+    if SCORE_COLUMN in df_results.columns:
+        rollup[f'Max_{SCORE_COLUMN}'] = df_results[SCORE_COLUMN].groupby(grouped_by).max()
+
+    # Streak runs on each entity's latest row
+    run_cols = [col for col in df_results.columns if col.endswith('_Streak_Periods')]
+    if run_cols:
+        order = np.arange(len(df_results))
+        if 'date' in df_results.columns:
+            order = np.lexsort((df_results['date'].to_numpy(), grouped_by))
+        latest = df_results[run_cols].take(order).groupby(grouped_by[order]).last()
+        for col in run_cols:
+            rollup[col.replace('_Streak_Periods', '_Current_Run')] = latest[col]
+
+    rollup = rollup.drop(index=-1, errors='ignore')
+    rollup.index = entities.cat.categories[rollup.index]
+    rollup.index.name = entity_col
+
+    sort_cols = ['Worst', 'Red_Rows'] + [col for col in rollup.columns if col.endswith('_Current_Run')]
+    rollup = rollup.sort_values(sort_cols, ascending=False, kind='stable')
+    return rollup.reset_index()
+
+
+def latest_row_mask(df_results, entity_col):
+    """Return a boolean mask of each entity's latest row (its last row by date)
+
+    Rows without an entity are never selected.
+    """
+    entities = df_results[entity_col]
+    if not isinstance(entities.dtype, pd.CategoricalDtype):
+        entities = entities.astype('category')
+    codes = entities.cat.codes.to_numpy()
+    keys = [df_results['date'].to_numpy()] if 'date' in df_results.columns else []
+    order = np.lexsort(keys + [codes])
+    ordered = codes[order]
+    last = np.r_[ordered[1:] != ordered[:-1], True] & (ordered >= 0)
+    mask = np.zeros(len(df_results), dtype=bool)
+    mask[order[last]] = True
+    return mask
+
+
+def entity_trend(df_results, entity_col, entity):
+    """Return the date and ratio columns of one entity, in date order"""
+    rows = df_results[df_results[entity_col] == entity]
+    value_cols = [col for col in rows.columns if col.endswith('_Value')]
+    if 'date' not in rows.columns or not value_cols:
+        return None
+    return rows[['date'] + value_cols].astype({col: 'float64' for col in value_cols}).sort_values('date')
@@ -0,0 +1,502 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from ews_engine import INPUT_COLUMNS, METRIC_COLUMNS, RATING_COLUMN
+
+# Rows per chunk when streaming large uploads
+DEFAULT_CHUNK_ROWS = 250_000
+
+# Columns read from columnar files; everything else is skipped
+READ_COLUMNS = ['date'] + INPUT_COLUMNS
+
+# Optional columns read when present, after any extra columns
+OPTIONAL_COLUMNS = [RATING_COLUMN] if RATING_COLUMN else []
+
+# Declared Arrow types of the known EWS CSV columns; ratings are dictionary-encoded
+CSV_COLUMN_TYPES = {
+    'date': pa.timestamp('ns'),
+    **{col: pa.float64() for col in INPUT_COLUMNS},
+    **{col: pa.dictionary(pa.int32(), pa.string()) for col in OPTIONAL_COLUMNS}
+}
+
+# Bytes per block handed to each pyarrow CSV parsing thread
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Rejected rows reported per file; further rejections are only counted
+MAX_DIAGNOSTICS = 1000
+
+# Numeric CSV values accepted when validating rows one by one
+NUMBER_PATTERN = r'^([-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?|[-+]?inf(inity)?|nan)$'
+
+# File extensions of the supported input formats
+FILE_FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'ipc',
+    '.feather': 'ipc',
+    '.ipc': 'ipc'
+}
+
+
+def file_format(name):
+    """Return 'csv', 'parquet' or 'ipc' for a file name"""
+    extension = os.path.splitext(str(name))[1].lower()
+    if extension not in FILE_FORMATS:
+        raise ValueError(f"Unsupported file type: {extension or name}")
+    return FILE_FORMATS[extension]
+
+
+def parse_dates(df):
+    """Convert the date column, if present, to datetimes"""
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def date_bounds(date_range):
+    """Return the (start, exclusive end) timestamps of an inclusive date range
+
+    Either end of the range may be None to leave it open.
+    """
+    start, end = date_range
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end) + pd.Timedelta(days=1)
+    return start, end
+
+
+def filter_dates(df, date_range=None):
+    """Keep the rows whose date lies in an inclusive (start, end) range"""
+    if date_range is None or 'date' not in df.columns:
+        return df
+    start, end = date_bounds(date_range)
+    keep = pd.Series(True, index=df.index)
+    if start is not None:
+        keep &= df['date'] >= start
+    if end is not None:
+        keep &= df['date'] < end
+    if keep.all():
+        return df
+    return df[keep.to_numpy()].reset_index(drop=True)
+
+
+def compact_inputs(df):
+    """Downcast numeric input columns to float32 where that loses no precision"""
+    for col in INPUT_COLUMNS:
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]) and df[col].dtype != np.float32:
+            values = df[col].to_numpy(dtype=np.float64)
+            compact = values.astype(np.float32)
+            if np.array_equal(compact.astype(np.float64), values, equal_nan=True):
+                df[col] = compact
+    return df
+
+
+def iter_csv_chunks(source, chunk_rows=DEFAULT_CHUNK_ROWS, date_range=None, extra_columns=()):
+    """Read a CSV file in fixed-size chunks of rows, with extra_columns (such as an entity key) as text"""
+    for chunk in pd.read_csv(source, chunksize=chunk_rows, dtype={col: str for col in extra_columns}):
+        yield filter_dates(parse_dates(chunk), date_range)
+
+
+def load_csv(source, date_range=None, stats=None, extra_columns=()):
+    """Load a whole CSV file into a DataFrame with compact input columns
+
+    Files with a known EWS header are parsed by the multithreaded pyarrow
+    reader; anything else falls back to pandas. If stats is a dict it receives
+    the parsing engine and the rejected rows. extra_columns (such as an entity
+    key) are kept as text alongside the EWS columns.
+    """
+    rejected = {'count': 0, 'rows': []}
+    try:
+        df = read_csv_arrow(source, rejected, extra_columns)
+    except pa.ArrowInvalid:
+        df = None
+    engine = 'pyarrow'
+
+    if df is None:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        df = parse_dates(pd.read_csv(source))
+        rejected = {'count': 0, 'rows': []}
+        engine = 'pandas'
+
+    if stats is not None:
+        stats['engine'] = engine
+        stats['rejected_count'] = rejected['count']
+        stats['rejected'] = rejected['rows']
+    return compact_inputs(filter_dates(df, date_range))
+
+
+def _csv_header(source):
+    """Return the column names on the first line of a CSV file"""
+    if hasattr(source, 'getbuffer'):
+        first_line = bytes(source.getbuffer()[:1024 * 1024]).split(b'\n', 1)[0]
+    else:
+        with open(source, 'rb') as f:
+            first_line = f.readline()
+    return [name.strip().strip('"') for name in first_line.decode('utf-8-sig').strip().split(',')]
+
+
+def _record_rejection(rejected, line, error, text):
+    """Count a rejected row, keeping its diagnostic while under MAX_DIAGNOSTICS"""
+    rejected['count'] += 1
+    if len(rejected['rows']) < MAX_DIAGNOSTICS:
+        rejected['rows'].append({'line': line, 'error': error, 'text': text})
+
+
+def _reject_invalid_values(table):
+    """Drop rows with unparseable dates or numbers from an all-string table
+
+    Returns the typed table and the (row index, error) of every dropped row,
+    indexed into the table as read.
+    """
+    valid = np.ones(table.num_rows, dtype=bool)
+    invalid = []
+    columns = {}
+
+    for name in table.column_names:
+        raw = table[name]
+        if name == 'date':
+            dates = pd.to_datetime(raw.to_pandas(), errors='coerce')
+            bad = dates.isna().to_numpy() & raw.is_valid().to_numpy(zero_copy_only=False)
+            columns[name] = pa.array(dates, type=pa.timestamp('ns'))
+        elif name not in INPUT_COLUMNS:
+            columns[name] = raw
+            continue
+        else:
+            trimmed = pc.utf8_trim_whitespace(raw)
+            bad_values = pc.invert(pc.match_substring_regex(trimmed, NUMBER_PATTERN, ignore_case=True)).fill_null(False)
+            bad = bad_values.to_numpy(zero_copy_only=False)
+            columns[name] = pc.cast(pc.if_else(bad_values, None, trimmed), pa.float64())
+
+        for row in np.flatnonzero(bad & valid):
+            invalid.append((int(row), f"invalid {name} value {raw[int(row)].as_py()!r}"))
+        valid &= ~bad
+
+    return pa.table(columns).filter(pa.array(valid)), sorted(invalid)
+
+
+def _line_index(source):
+    """Return the bytes of a CSV source with the start and end offsets and line numbers of its non-empty lines
+
+    Line ends exclude the newline and any carriage return. The parser skips
+    empty lines, so the first line is the header and the rest are data rows.
+    """
+    data = np.frombuffer(_arrow_source(source).read_buffer(), dtype=np.uint8)
+    newlines = np.flatnonzero(data == ord('\n'))
+    starts = np.r_[0, newlines + 1]
+    ends = np.r_[newlines, len(data)]
+    ends -= (ends > starts) & (data[np.maximum(ends - 1, 0)] == ord('\r'))
+    nonempty = np.flatnonzero(ends > starts)
+    return data, starts[nonempty], ends[nonempty], nonempty + 1
+
+
+def _record_rejections(source, rejected, skipped, invalid):
+    """Record rejected rows with the line number and text they have in the source file
+
+    skipped holds the (text, error) of rows the parser skipped for their field
+    count, and invalid the (row index, error) of rows dropped from the parsed
+    table. Skipped rows are found among the lines with an unexpected number
+    of commas; the parsed rows are the remaining data lines in order. Lines
+    that cannot be located (commas inside quotes) are reported without a
+    number.
+    """
+    data, starts, ends, numbers = _line_index(source)
+
+    def text_of(i):
+        return bytes(data[starts[i]:ends[i]]).decode('utf-8', errors='replace')
+
+    comma_offsets = np.flatnonzero(data == ord(','))
+    commas = np.searchsorted(comma_offsets, ends) - np.searchsorted(comma_offsets, starts)
+    candidates = {}
+    for i in np.flatnonzero(commas != commas[0]):
+        if i > 0:
+            candidates.setdefault(text_of(i), []).append(i)
+
+    entries = []
+    skipped_lines = []
+    for text, error in skipped:
+        matches = candidates.get(text.rstrip('\r'))
+        line = matches.pop(0) if matches else None
+        if line is not None:
+            skipped_lines.append(line)
+        entries.append((None if line is None else int(numbers[line]), error, text))
+
+    if invalid:
+        located = len(skipped_lines) == len(skipped)
+        data_lines = np.setdiff1d(np.arange(1, len(starts)), skipped_lines)
+        for row, error in invalid:
+            if located and row < len(data_lines):
+                entries.append((int(numbers[data_lines[row]]), error, text_of(data_lines[row])))
+            else:
+                entries.append((None, error, None))
+
+    for line, error, text in sorted(entries, key=lambda entry: (entry[0] is None, entry[0] or 0)):
+        _record_rejection(rejected, line, error, text)
+
+
+def read_csv_arrow(source, rejected, extra_columns=()):
+    """Parse a CSV into a DataFrame with read_csv_table, or return None for unknown layouts"""
+    table = read_csv_table(source, rejected, extra_columns)
+    return None if table is None else table.to_pandas()
+
+
+def read_csv_table(source, rejected, extra_columns=()):
+    """Parse a CSV with pyarrow's multithreaded reader and the declared EWS column types
+
+    Only the known EWS columns are read. Rows with the wrong number of fields or
+    with unparseable values are skipped and recorded in rejected, a dict with a
+    'count' and a list of 'rows' diagnostics (the 1-based line number in the
+    file, the error and the line text). Returns None if the header does not
+    describe any EWS metric.
+    """
+    header = _csv_header(source)
+    if not any(num in header and den in header for num, den in METRIC_COLUMNS.values()):
+        return None
+    columns = [col for col in _read_columns(extra_columns) if col in header]
+    skipped = []
+
+    def reject(row):
+        # Row numbers are not known to the multithreaded parser; lines are located afterwards
+        skipped.append((row.text, f"expected {row.expected_columns} fields, found {row.actual_columns}"))
+        return 'skip'
+
+    def read(column_types):
+        skipped.clear()
+        return pcsv.read_csv(
+            _arrow_source(source),
+            read_options=pcsv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE),
+            parse_options=pcsv.ParseOptions(invalid_row_handler=reject),
+            convert_options=pcsv.ConvertOptions(
+                column_types=column_types,
+                include_columns=columns,
+                strings_can_be_null=True
+            )
+        )
+
+    invalid = []
+    try:
+        table = read({col: CSV_COLUMN_TYPES.get(col, pa.string()) for col in columns})
+    except pa.ArrowInvalid:
+        # Some value did not convert: re-read as text and drop the offending rows
+        table, invalid = _reject_invalid_values(read({col: pa.string() for col in columns}))
+
+    if skipped or invalid:
+        _record_rejections(source, rejected, skipped, invalid)
+    return table
+
+
+def _arrow_source(source):
+    """Return a zero-copy Arrow reader for a path or an in-memory upload"""
+    if hasattr(source, 'getbuffer'):
+        return pa.BufferReader(source.getbuffer())
+    return pa.memory_map(str(source))
+
+
+def _read_columns(extra_columns=()):
+    """Return the EWS columns, then any extra columns, then the optional columns"""
+    return list(dict.fromkeys([*READ_COLUMNS, *extra_columns, *OPTIONAL_COLUMNS]))
+
+
+def _projected_columns(schema, extra_columns=()):
+    """Return the EWS columns, plus any extra and optional columns, present in an Arrow schema"""
+    return [col for col in _read_columns(extra_columns) if col in schema.names]
+
+
+def _date_filter(schema, date_range):
+    """Build an Arrow filter for an inclusive date range, or None if it cannot be pushed down"""
+    if date_range is None or 'date' not in schema.names:
+        return None
+    date_type = schema.field('date').type
+    if not (pa.types.is_timestamp(date_type) or pa.types.is_date(date_type)):
+        return None
+
+    def to_scalar(bound):
+        if pa.types.is_date(date_type):
+            return pa.scalar(bound.date(), type=date_type)
+        return pa.scalar(bound.to_pydatetime(), type=pa.timestamp('us')).cast(date_type)
+
+    start, end = date_bounds(date_range)
+    expression = None
+    if start is not None:
+        expression = ds.field('date') >= to_scalar(start)
+    if end is not None:
+        upper = ds.field('date') < to_scalar(end)
+        expression = upper if expression is None else expression & upper
+    return expression
+
+
+def _arrow_to_frame(table, date_range):
+    """Convert an Arrow table of EWS columns to a compact DataFrame"""
+    df = table.to_pandas(ignore_metadata=True)
+    return compact_inputs(filter_dates(parse_dates(df), date_range))
+
+
+def read_parquet_table(source, date_range=None, extra_columns=()):
+    """Read the EWS columns of a Parquet file, skipping row groups outside the date range"""
+    source = _arrow_source(source)
+    schema = pq.read_schema(source)
+    source.seek(0)
+    return pq.read_table(
+        source,
+        columns=_projected_columns(schema, extra_columns),
+        filters=_date_filter(schema, date_range)
+    )
+
+
+def _open_ipc(source):
+    """Open an Arrow IPC file, falling back to the streaming format"""
+    source = _arrow_source(source)
+    try:
+        return pa.ipc.open_file(source)
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pa.ipc.open_stream(source)
+
+
+def read_ipc_table(source, date_range=None, extra_columns=()):
+    """Read the EWS columns of an Arrow IPC (Feather v2) file"""
+    table = _open_ipc(source).read_all()
+    table = table.select(_projected_columns(table.schema, extra_columns))
+    date_filter = _date_filter(table.schema, date_range)
+    return table if date_filter is None else table.filter(date_filter)
+
+
+def _source_size(source):
+    """Return the size in bytes of a path or an in-memory upload"""
+    if hasattr(source, 'getbuffer'):
+        return source.getbuffer().nbytes
+    return os.path.getsize(source)
+
+
+def load_file(source, name=None, date_range=None, stats=None, extra_columns=()):
+    """Load a CSV, Parquet or Arrow IPC file into a compact DataFrame
+
+    If stats is a dict it receives the parsing engine, bytes read, elapsed
+    seconds and, for CSV, the rejected rows. extra_columns are read in
+    addition to the EWS columns when present.
+    """
+    fmt = file_format(name if name is not None else source)
+    stats = {} if stats is None else stats
+    start = time.perf_counter()
+
+    if fmt == 'parquet':
+        df = _arrow_to_frame(read_parquet_table(source, date_range, extra_columns), date_range)
+        stats['engine'] = 'pyarrow'
+    elif fmt == 'ipc':
+        df = _arrow_to_frame(read_ipc_table(source, date_range, extra_columns), date_range)
+        stats['engine'] = 'pyarrow'
+    else:
+        df = load_csv(source, date_range, stats, extra_columns)
+
+    stats['bytes'] = _source_size(source)
+    stats['seconds'] = time.perf_counter() - start
+    return df
+
+
+def load_table(source, name=None, date_range=None, stats=None, extra_columns=()):
+    """Load a CSV, Parquet or Arrow IPC file as an Arrow table without going through pandas
+
+    Parquet and IPC columns are used as read (memory-mapped for paths) and CSVs
+    are parsed by the pyarrow reader. Dates become timestamp[ns]. Files the
+    Arrow readers cannot type (text dates, unrecognised CSV layouts) are
+    loaded with load_file and converted. stats is filled as by load_file.
+    """
+    fmt = file_format(name if name is not None else source)
+    stats = {} if stats is None else stats
+    start = time.perf_counter()
+
+    if fmt == 'parquet':
+        table = read_parquet_table(source, date_range, extra_columns)
+    elif fmt == 'ipc':
+        table = read_ipc_table(source, date_range, extra_columns)
+    else:
+        rejected = {'count': 0, 'rows': []}
+        try:
+            table = read_csv_table(source, rejected, extra_columns)
+        except pa.ArrowInvalid:
+            table = None
+        stats['rejected_count'] = rejected['count']
+        stats['rejected'] = rejected['rows']
+
+    if table is not None and 'date' in table.column_names:
+        date_type = table.schema.field('date').type
+        if pa.types.is_timestamp(date_type) or pa.types.is_date(date_type):
+            dates = pc.cast(table['date'], pa.timestamp('ns'))
+            table = table.set_column(table.schema.get_field_index('date'), 'date', dates)
+            date_filter = _date_filter(table.schema, date_range)
+            if date_filter is not None:
+                table = table.filter(date_filter)
+        else:
+            table = None
+
+    if table is None:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        df = load_file(source, name, date_range, stats, extra_columns)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    else:
+        stats['engine'] = 'pyarrow'
+
+    stats['bytes'] = _source_size(source)
+    stats['seconds'] = time.perf_counter() - start
+    return table
+
+
+def _row_groups_in_range(parquet_file, date_range):
+    """Return the indexes of the row groups whose date statistics overlap a date range"""
+    row_groups = list(range(parquet_file.num_row_groups))
+    names = parquet_file.schema_arrow.names
+    if date_range is None or 'date' not in names:
+        return row_groups
+
+    start, end = date_bounds(date_range)
+    date_index = parquet_file.schema_arrow.get_field_index('date')
+    selected = []
+    for i in row_groups:
+        stats = parquet_file.metadata.row_group(i).column(date_index).statistics
+        if stats is None or not stats.has_min_max:
+            selected.append(i)
+            continue
+        try:
+            if (start is None or pd.Timestamp(stats.max) >= start) and (end is None or pd.Timestamp(stats.min) < end):
+                selected.append(i)
+        except (TypeError, ValueError):
+            selected.append(i)
+    return selected
+
+
+def iter_file_chunks(source, name=None, chunk_rows=DEFAULT_CHUNK_ROWS, date_range=None, extra_columns=()):
+    """Read a CSV, Parquet or Arrow IPC file in chunks of at most chunk_rows rows"""
+    fmt = file_format(name if name is not None else source)
+    if fmt == 'csv':
+        yield from iter_csv_chunks(source, chunk_rows, date_range, extra_columns)
+        return
+
+    if fmt == 'parquet':
+        parquet_file = pq.ParquetFile(_arrow_source(source))
+        columns = _projected_columns(parquet_file.schema_arrow, extra_columns)
+        batches = parquet_file.iter_batches(
+            batch_size=chunk_rows,
+            row_groups=_row_groups_in_range(parquet_file, date_range),
+            columns=columns
+        )
+    else:
+        reader = _open_ipc(source)
+        columns = _projected_columns(reader.schema, extra_columns)
+        if isinstance(reader, pa.ipc.RecordBatchFileReader):
+            batches = (reader.get_batch(i).select(columns) for i in range(reader.num_record_batches))
+        else:
+            batches = (batch.select(columns) for batch in reader)
+
+    for batch in batches:
+        for offset in range(0, batch.num_rows, chunk_rows):
+            chunk = pa.Table.from_batches([batch.slice(offset, chunk_rows)])
+            yield _arrow_to_frame(chunk, date_range)
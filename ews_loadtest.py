@@ -0,0 +1,118 @@
+"""Load-test the EWS scoring service on localhost
+
+Concurrent clients post generated borrower snapshots to /score and the
+client-side p50/p99 latency and throughput are reported together with the
+service's own /stats.
+
+Example:
+    python ews_service.py &
+    python ews_loadtest.py --concurrency 64 --requests 20000 --rows-per-request 1
+    python ews_loadtest.py --spawn --concurrency 64 --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+from ews_engine import INPUT_COLUMNS, RATING_COLUMN
+from ews_service import DEFAULT_PORT
+from generate_ews_sample_data import generate_borrower_data
+
+
+def sample_rows(count, seed=0):
+    """Return borrower snapshots as JSON-ready row dicts"""
+    num_days = 30
+    df = generate_borrower_data(max(1, -(-count // num_days)), num_days, seed=seed).head(count)
+    columns = INPUT_COLUMNS + ([RATING_COLUMN] if RATING_COLUMN in df.columns else [])
+    return df[columns].to_dict('records')
+
+
+async def wait_until_up(client, url, timeout=30):
+    """Poll the stats endpoint until the service answers"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.fetch(f"{url}/stats")
+            return
+        except (ConnectionError, HTTPClientError, OSError):
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run_load(url, concurrency, requests, rows_per_request, seed=0):
+    """Post requests from concurrent clients, returning the per-request latencies and elapsed time"""
+    rows = sample_rows(max(rows_per_request, min(requests * rows_per_request, 10_000)), seed)
+    bodies = []
+    for i in range(min(requests, 1000)):
+        start = i * rows_per_request % (len(rows) - rows_per_request + 1)
+        chunk = rows[start:start + rows_per_request]
+        bodies.append(json.dumps(chunk if rows_per_request > 1 else chunk[0]))
+    AsyncHTTPClient.configure(None, max_clients=concurrency)
+    client = AsyncHTTPClient()
+    await wait_until_up(client, url)
+    latencies = np.empty(requests)
+    next_request = iter(range(requests))
+
+    async def worker():
+        for i in next_request:
+            start = time.perf_counter()
+            await client.fetch(f"{url}/score", method='POST', body=bodies[i % len(bodies)],
+                               headers={'Content-Type': 'application/json'})
+            latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stats = json.loads((await client.fetch(f"{url}/stats")).body)
+    return latencies, elapsed, stats
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Load-test the EWS scoring service")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}", help="Base URL of the service")
+    parser.add_argument("-c", "--concurrency", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("-n", "--requests", type=int, default=10_000, help="Total requests")
+    parser.add_argument("--rows-per-request", type=int, default=1, help="Rows posted per request (1 posts a single object)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated snapshots")
+    parser.add_argument("--spawn", action="store_true", help="Start ews_service.py on the URL's port for the run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the load test and print the latency and throughput"""
+    args = parse_args(argv)
+    service = None
+    if args.spawn:
+        port = args.url.rsplit(':', 1)[-1].split('/')[0]
+        service = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ews_service.py'), '--port', port],
+            stdout=subprocess.DEVNULL
+        )
+    try:
+        latencies, elapsed, stats = asyncio.run(
+            run_load(args.url, args.concurrency, args.requests, args.rows_per_request, args.seed)
+        )
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+
+    p50, p99 = np.percentile(latencies * 1000, [50, 99])
+    print(f"{args.requests:,} requests x {args.rows_per_request} rows from {args.concurrency} clients in {elapsed:.2f}s")
+    print(f"Client latency: p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    print(f"Throughput: {args.requests / elapsed:,.0f} requests/s, {args.requests * args.rows_per_request / elapsed:,.0f} rows/s")
+    print(f"Service: p50 {stats['latency_ms']['p50']} ms, p99 {stats['latency_ms']['p99']} ms, "
+          f"{stats['batches']:,} batches, mean {stats['mean_batch_rows']} rows per batch")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
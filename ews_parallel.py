@@ -0,0 +1,245 @@
+"""Chunk-parallel scoring of one large frame over shared-memory buffers
+
+The input columns are copied once into a shared-memory block. Worker
+processes attach to it by name, score contiguous row blocks in place and
+return only their status counts and per-date trend sums, so no row data is
+pickled between processes.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from ews_engine import (
+    DEFAULT_THRESHOLDS,
+    METRIC_COLUMNS,
+    RATING_COLUMN,
+    STATUS_DTYPE,
+    STATUS_LABELS,
+    _ratio,
+    add_composite,
+    add_rating_status,
+    compile_thresholds,
+    new_summary
+)
+
+# Frames smaller than this are never scored in shared-memory mode
+SHARED_MIN_ROWS = 2_000_000
+
+# Measured seconds per row (4M-row benchmark): the single-process scoring and
+# summary path, the calling process's copies in and out in shared-memory mode,
+# and the block scoring split across the workers
+SCORE_ROW_SECONDS = 250e-9
+SHARED_ROW_SECONDS = 225e-9
+BLOCK_ROW_SECONDS = 240e-9
+
+# Rows scored per task
+DEFAULT_BLOCK_ROWS = 1_000_000
+
+# Missing dates as int64 nanoseconds
+_NAT = np.iinfo(np.int64).min
+
+# Shared buffers attached in each worker process
+_worker_buffers = {}
+
+# Worker start-up time, measured once per process
+_measured = {}
+
+
+def available_cores():
+    """Return the number of CPU cores this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def spawn_seconds():
+    """Return the time to start a spawned worker process and run a task in it, measured on first use"""
+    if 'spawn' not in _measured:
+        start = time.perf_counter()
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            executor.submit(available_cores).result()
+        _measured['spawn'] = time.perf_counter() - start
+    return _measured['spawn']
+
+
+def use_shared(rows, workers):
+    """Return whether a frame of this many rows scores faster in shared-memory mode
+
+    Workers are capped at the available cores. The estimate weighs the
+    measured worker start-up and the per-row copies in the calling process
+    against the block scoring saved by the extra workers, so on few cores
+    the single-process path is kept however large the frame.
+    """
+    workers = min(workers, available_cores())
+    if workers <= 1 or rows < SHARED_MIN_ROWS:
+        return False
+    single = rows * SCORE_ROW_SECONDS
+    shared = rows * (SHARED_ROW_SECONDS + BLOCK_ROW_SECONDS / workers)
+    # Worker start-up is only measured when the per-row costs leave room for it
+    return shared < single and spawn_seconds() + shared < single
+
+
+def _create_buffer(segments, name, shape, dtype):
+    """Allocate a shared-memory array, recording its segment and layout under name"""
+    size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    segment = shared_memory.SharedMemory(create=True, size=size)
+    segments[name] = (segment, shape, np.dtype(dtype).str)
+    return np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+
+def _attach(layout):
+    """Worker initializer: map the shared buffers described by layout"""
+    for name, (segment_name, shape, dtype) in layout['buffers'].items():
+        segment = shared_memory.SharedMemory(name=segment_name)
+        _worker_buffers[name] = (segment, np.ndarray(shape, dtype=dtype, buffer=segment.buf))
+    _worker_buffers['layout'] = layout
+
+
+def _block_trend(dates, ratios, masks):
+    """Return the dates of a block with the per-date sums and counts of each ratio"""
+    present = dates != _NAT
+    keys, inverse = np.unique(dates[present], return_inverse=True)
+    sums = np.empty((len(ratios), len(keys)))
+    counts = np.empty((len(ratios), len(keys)), dtype=np.int64)
+    for i, (ratio, mask) in enumerate(zip(ratios, masks)):
+        # Masked (zero-denominator) ratios are skipped; NaN ratios propagate, as in groupby
+        valid = ~mask[present]
+        sums[i] = np.bincount(inverse, weights=np.where(valid, ratio[present], 0.0), minlength=len(keys))
+        counts[i] = np.bincount(inverse[valid], minlength=len(keys))
+    return keys, sums, counts
+
+
+def _score_block(start, stop):
+    """Score rows start:stop of the shared inputs into the shared outputs"""
+    layout = _worker_buffers['layout']
+    inputs = _worker_buffers['inputs'][1]
+    codes = _worker_buffers['codes'][1]
+    ratios = _worker_buffers['ratios'][1]
+    masks = _worker_buffers['masks'][1]
+    kernels = compile_thresholds(layout['thresholds'])
+    status_counts = np.empty((len(layout['metrics']), len(STATUS_LABELS)), dtype=np.int64)
+
+    for i, (metric, numerator, denominator) in enumerate(layout['metrics']):
+        ratio, zero_denominator = _ratio(inputs[numerator, start:stop], inputs[denominator, start:stop])
+        ratios[i, start:stop] = ratio
+        masks[i, start:stop] = zero_denominator
+        codes[i, start:stop] = kernels[metric](ratio)
+        status_counts[i] = np.bincount(codes[i, start:stop], minlength=len(STATUS_LABELS))
+
+    trend = None
+    if 'dates' in _worker_buffers:
+        trend = _block_trend(
+            _worker_buffers['dates'][1][start:stop], ratios[:, start:stop], masks[:, start:stop]
+        )
+    return status_counts, trend
+
+
+def _reduce_trend(trends, value_cols):
+    """Combine per-block trend sums and counts into the summary's date-indexed frames"""
+    keys = np.concatenate([trend[0] for trend in trends])
+    dates, inverse = np.unique(keys, return_inverse=True)
+    sums = np.concatenate([trend[1] for trend in trends], axis=1)
+    counts = np.concatenate([trend[2] for trend in trends], axis=1)
+    index = pd.Index(dates.view('datetime64[ns]'), name='date')
+    trend_sums = pd.DataFrame(
+        {col: np.bincount(inverse, weights=sums[i], minlength=len(dates)) for i, col in enumerate(value_cols)},
+        index=index
+    )
+    trend_counts = pd.DataFrame(
+        {col: np.bincount(inverse, weights=counts[i], minlength=len(dates)).astype(np.int64)
+         for i, col in enumerate(value_cols)},
+        index=index
+    )
+    return trend_sums, trend_counts
+
+
+def score_shared(df, step_values=None, thresholds=None, workers=None, block_rows=DEFAULT_BLOCK_ROWS):
+    """Score a frame in row blocks across worker processes over shared memory
+
+    Returns the compact results DataFrame (as score_frame builds it) and a
+    running summary reduced from the blocks' status counts and trend sums.
+    Credit rating and composite statuses are added in the calling process
+    and are not in the summary. workers defaults to os.cpu_count().
+    """
+    thresholds = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+    workers = os.cpu_count() if workers is None else max(1, workers)
+    rows = len(df)
+    metrics = [
+        (metric, numerator, denominator) for metric, (numerator, denominator) in METRIC_COLUMNS.items()
+        if numerator in df.columns and denominator in df.columns
+    ]
+    input_cols = list(dict.fromkeys(col for _, numerator, denominator in metrics for col in (numerator, denominator)))
+    has_dates = 'date' in df.columns
+    segments = {}
+
+    try:
+        inputs = _create_buffer(segments, 'inputs', (len(input_cols), rows), np.float64)
+        for i, col in enumerate(input_cols):
+            inputs[i] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        if has_dates:
+            dates = _create_buffer(segments, 'dates', (rows,), np.int64)
+            dates[:] = df['date'].to_numpy().astype('datetime64[ns]').view(np.int64)
+        codes = _create_buffer(segments, 'codes', (len(metrics), rows), np.int8)
+        ratios = _create_buffer(segments, 'ratios', (len(metrics), rows), np.float64)
+        masks = _create_buffer(segments, 'masks', (len(metrics), rows), np.bool_)
+
+        layout = {
+            'buffers': {name: (segment.name, shape, dtype) for name, (segment, shape, dtype) in segments.items()},
+            'metrics': [
+                (metric, input_cols.index(numerator), input_cols.index(denominator))
+                for metric, numerator, denominator in metrics
+            ],
+            'thresholds': thresholds
+        }
+        bounds = [(start, min(start + block_rows, rows)) for start in range(0, rows, block_rows)]
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(
+            max_workers=max(1, min(workers, len(bounds))),
+            mp_context=context,
+            initializer=_attach,
+            initargs=(layout,)
+        ) as executor:
+            parts = list(executor.map(_score_block, *zip(*bounds))) if bounds else []
+
+        # Copy the results out of the shared buffers before they are released
+        columns = {}
+        for i, (metric, _, _) in enumerate(metrics):
+            columns[metric] = pd.Categorical.from_codes(codes[i].copy(), dtype=STATUS_DTYPE)
+            columns[f'{metric}_Value'] = pd.arrays.FloatingArray(ratios[i].copy(), masks[i].copy())
+    finally:
+        # Views must be released before their segments close, or close() raises BufferError
+        inputs = dates = codes = ratios = masks = None
+        for segment, _, _ in segments.values():
+            segment.unlink()
+            segment.close()
+
+    df_results = pd.DataFrame(columns, index=pd.RangeIndex(rows), copy=False)
+    if has_dates:
+        df_results['date'] = df['date'].to_numpy()
+    if RATING_COLUMN in df.columns:
+        add_rating_status(df_results, df[RATING_COLUMN])
+    add_composite(df_results)
+
+    # Reduce the per-block aggregates into a running summary
+    summary = new_summary()
+    summary['rows'] = rows
+    for i, (metric, _, _) in enumerate(metrics):
+        counts = pd.Series(
+            sum(part[0][i] for part in parts) if parts else np.zeros(len(STATUS_LABELS), dtype=np.int64),
+            index=pd.Index(STATUS_LABELS, dtype=object)
+        )
+        counts = counts[counts > 0].sort_values(ascending=False, kind='stable')
+        summary['status_counts'][metric] = counts
+    if has_dates and parts and metrics:
+        summary['trend_sums'], summary['trend_counts'] = _reduce_trend(
+            [part[1] for part in parts], [f'{metric}_Value' for metric, _, _ in metrics]
+        )
+
+    return df_results, summary
@@ -0,0 +1,302 @@
+"""JSON scoring service for EWS statuses, built on tornado
+
+POST /score takes one row (a JSON object) or an array of rows, using the
+calculate_all_metrics field names (actual_volume, target_volume, ...) plus an
+optional credit_rating, and returns the statuses, ratios, Worst and EWS_Score
+of each row in the same shape. Rows from concurrent requests are coalesced
+into micro-batches and scored together by the vectorized engine.
+GET /stats returns request, row and batch counters with p50/p99 latency and
+throughput.
+
+Example:
+    python ews_service.py --port 8765 --max-batch-rows 4096 --max-wait-ms 2
+"""
+import argparse
+import asyncio
+import collections
+import json
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import tornado.web
+
+from ews_engine import (
+    INPUT_COLUMNS,
+    RATING_COLUMN,
+    RATING_STATUS_COLUMN,
+    STATUS_DTYPE,
+    add_composite,
+    labelled_results,
+    rating_status,
+    score_frame
+)
+
+DEFAULT_PORT = 8765
+
+# A batch is scored once it has this many rows, or max_wait_ms after its first request
+DEFAULT_MAX_BATCH_ROWS = 4096
+DEFAULT_MAX_WAIT_MS = 2.0
+
+# Latencies kept for the percentiles and recent throughput in /stats
+LATENCY_WINDOW = 10_000
+
+
+class RequestError(ValueError):
+    """A scoring request that cannot be scored"""
+
+
+def parse_rows(body):
+    """Parse a request body into a list of row dicts, and whether it was a single row
+
+    Every input field must be present as a finite number or null (scored as
+    a missing value); numbers are converted to float. credit_rating is
+    optional.
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise RequestError(f"Invalid JSON: {e}")
+    single = isinstance(payload, dict)
+    rows = [payload] if single else payload
+    if not isinstance(rows, list) or not rows:
+        raise RequestError("Expected a row object or a non-empty array of row objects")
+
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise RequestError(f"Row {i}: expected an object")
+        missing = [col for col in INPUT_COLUMNS if col not in row]
+        if missing:
+            raise RequestError(f"Row {i}: missing fields {', '.join(missing)}")
+        for col in INPUT_COLUMNS:
+            value = row[col]
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise RequestError(f"Row {i}: {col} must be a number")
+            try:
+                row[col] = float(value)
+            except OverflowError:
+                raise RequestError(f"Row {i}: {col} is out of range")
+            if not math.isfinite(row[col]):
+                raise RequestError(f"Row {i}: {col} must be finite")
+        rating = row.get(RATING_COLUMN)
+        if RATING_COLUMN is not None and rating is not None and not isinstance(rating, str):
+            raise RequestError(f"Row {i}: {RATING_COLUMN} must be a string")
+    return rows, single
+
+
+def score_rows(rows):
+    """Score a batch of row dicts, returning one result dict per row
+
+    Each row is an independent snapshot, so a credit rating is never
+    compared with another row's and no streaks are counted. Every result
+    has the same fields whatever else is in the batch: missing or non-finite
+    ratios (zero denominators, missing inputs or overflow) and the
+    Credit_Rating status of a row without a rating are null.
+    """
+    df = pd.DataFrame(
+        {col: np.array([row[col] for row in rows], dtype=np.float64) for col in INPUT_COLUMNS},
+        index=pd.RangeIndex(len(rows))
+    )
+    df_results = score_frame(df)
+
+    if RATING_COLUMN is not None:
+        # One group per row: no rating drop across unrelated snapshots
+        ratings = pd.Series([row.get(RATING_COLUMN) for row in rows], dtype=object)
+        codes, _ = rating_status(ratings, groups=np.arange(len(rows)))
+        df_results[RATING_STATUS_COLUMN] = pd.Categorical.from_codes(codes, dtype=STATUS_DTYPE)
+        add_composite(df_results)
+
+    df_labels = labelled_results(df_results)
+    columns = {col: df_labels[col].tolist() for col in df_labels.columns}
+    return [
+        {col: (None if isinstance(value, float) and not math.isfinite(value) else value) for col, value in zip(columns, values)}
+        for values in zip(*columns.values())
+    ]
+
+
+class MicroBatcher:
+    """Coalesce rows from concurrent requests into batches scored off the event loop
+
+    Scoring runs on a single background thread, so the event loop keeps
+    accepting requests and forming the next batch while one is scored.
+    """
+
+    def __init__(self, max_batch_rows=DEFAULT_MAX_BATCH_ROWS, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.pending = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.started = time.monotonic()
+        self.counters = {'requests': 0, 'rows': 0, 'batches': 0, 'errors': 0}
+        # (finish time, latency seconds) of recent requests
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    async def score(self, rows):
+        """Queue rows for the next batch and wait for their results"""
+        future = asyncio.get_running_loop().create_future()
+        await self.pending.put((rows, future))
+        return await future
+
+    async def _next_batch(self):
+        """Wait for a first request, then collect more until the batch is full or the wait expires"""
+        batch = [await self.pending.get()]
+        batch_rows = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while batch_rows < self.max_batch_rows:
+            try:
+                item = self.pending.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.pending.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            batch_rows += len(item[0])
+        return batch
+
+    async def run(self):
+        """Score batches until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            rows = [row for request_rows, _ in batch for row in request_rows]
+            try:
+                results = await loop.run_in_executor(self.executor, score_rows, rows)
+            except Exception:
+                # Score the requests one at a time, so a failing request does not fail the others
+                for request_rows, future in batch:
+                    try:
+                        request_results = await loop.run_in_executor(self.executor, score_rows, request_rows)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                        continue
+                    self.counters['batches'] += 1
+                    if not future.done():
+                        future.set_result(request_results)
+                continue
+            self.counters['batches'] += 1
+            start = 0
+            for request_rows, future in batch:
+                if not future.done():
+                    future.set_result(results[start:start + len(request_rows)])
+                start += len(request_rows)
+
+    def record(self, received, rows, error=False):
+        """Count a finished request and its latency"""
+        now = time.monotonic()
+        self.counters['requests'] += 1
+        self.counters['rows'] += rows
+        if error:
+            self.counters['errors'] += 1
+        self.latencies.append((now, now - received))
+
+    def stats(self):
+        """Return the counters, latency percentiles (ms) and throughput"""
+        uptime = time.monotonic() - self.started
+        stats = {**self.counters, 'uptime_seconds': round(uptime, 3)}
+        stats['mean_batch_rows'] = round(self.counters['rows'] / self.counters['batches'], 2) if self.counters['batches'] else 0
+        stats['requests_per_second'] = round(self.counters['requests'] / uptime, 2) if uptime else 0
+        stats['rows_per_second'] = round(self.counters['rows'] / uptime, 2) if uptime else 0
+        if self.latencies:
+            finished, latencies = np.array(self.latencies).T
+            p50, p99 = np.percentile(latencies * 1000, [50, 99])
+            span = finished[-1] - finished[0]
+            stats['latency_ms'] = {'p50': round(p50, 3), 'p99': round(p99, 3), 'window': len(latencies)}
+            stats['window_requests_per_second'] = round((len(latencies) - 1) / span, 2) if span > 0 else None
+        else:
+            stats['latency_ms'] = {'p50': None, 'p99': None, 'window': 0}
+            stats['window_requests_per_second'] = None
+        return stats
+
+
+class ScoreHandler(tornado.web.RequestHandler):
+    """POST /score: score one row or an array of rows"""
+
+    def initialize(self, batcher):
+        self.batcher = batcher
+
+    async def post(self):
+        received = time.monotonic()
+        try:
+            rows, single = parse_rows(self.request.body)
+        except RequestError as e:
+            self.batcher.record(received, 0, error=True)
+            self.set_status(400)
+            self.finish({'error': str(e)})
+            return
+        try:
+            results = await self.batcher.score(rows)
+        except Exception as e:
+            self.batcher.record(received, len(rows), error=True)
+            self.set_status(500)
+            self.finish({'error': f"Scoring failed: {e}"})
+            return
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps(results[0] if single else results))
+        self.batcher.record(received, len(rows))
+
+
+class StatsHandler(tornado.web.RequestHandler):
+    """GET /stats: latency and throughput counters"""
+
+    def initialize(self, batcher):
+        self.batcher = batcher
+
+    def get(self):
+        self.finish(self.batcher.stats())
+
+
+def make_app(batcher):
+    """Build the tornado application around a MicroBatcher"""
+    return tornado.web.Application([
+        (r'/score', ScoreHandler, {'batcher': batcher}),
+        (r'/stats', StatsHandler, {'batcher': batcher})
+    ])
+
+
+async def serve(address='127.0.0.1', port=DEFAULT_PORT, max_batch_rows=DEFAULT_MAX_BATCH_ROWS,
+                max_wait_ms=DEFAULT_MAX_WAIT_MS):
+    """Run the service until cancelled"""
+    batcher = MicroBatcher(max_batch_rows, max_wait_ms)
+    server = make_app(batcher).listen(port, address)
+    print(f"Scoring on http://{address}:{port}/score (stats on /stats)", flush=True)
+    batches = asyncio.create_task(batcher.run())
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.stop()
+        batches.cancel()
+        batcher.executor.shutdown()
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Serve EWS scoring as a JSON HTTP endpoint")
+    parser.add_argument("--address", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--max-batch-rows", type=int, default=DEFAULT_MAX_BATCH_ROWS, help="Rows scored per micro-batch at most")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS, help="Time a batch waits for more requests")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the scoring service until interrupted"""
+    args = parse_args(argv)
+    try:
+        asyncio.run(serve(args.address, args.port, args.max_batch_rows, args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
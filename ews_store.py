@@ -0,0 +1,459 @@
+"""Month-partitioned Parquet store of scored EWS results
+
+Each scored file is written as one part per month under
+<store>/month=YYYY-MM/<part>.parquet, keeping the compact results columns
+(categorical statuses, nullable ratios) as Parquet dictionary and nullable
+columns. Rows without a date go to month=undated.
+
+A history store keeps scoring runs over time (uploads saved from the app
+and files scored by ews_watch): each run appends only the dates newer than
+the ones already stored for each entity from the same source file, so status
+transitions between two runs and one entity's history can be queried
+without rescoring anything. A run can instead replace everything stored
+from its source, as ews_watch does when a file is rescored.
+"""
+import datetime
+import functools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from ews_engine import STATUS_DTYPE, STATUS_LABELS, status_columns
+
+# Partition of rows without a date
+UNDATED_PARTITION = 'undated'
+
+# Default history store directory, overridable with EWS_HISTORY_DIR
+HISTORY_DIR = os.environ.get('EWS_HISTORY_DIR', 'ews_history')
+
+# Manifest of the runs, the entity column and the parts of a history store
+RUNS_FILE = '_runs.json'
+
+# Latest stored date per source and entity, read on every append
+LATEST_FILE = '_latest.parquet'
+
+# Unified schema of all history parts
+SCHEMA_FILE = '_common_metadata'
+
+# Run number and source file of each history row
+RUN_COLUMN = 'run'
+SOURCE_COLUMN = 'source'
+
+# A month with more history parts than this is merged into one file sorted by entity and date
+MAX_MONTH_PARTS = 4
+
+# Small row groups let entity lookups skip most of each history part
+HISTORY_ROW_GROUP_ROWS = 4096
+
+
+def month_partitions(df_results):
+    """Return (month label, row positions) pairs for the months present in a results frame"""
+    if 'date' not in df_results.columns:
+        return [(UNDATED_PARTITION, np.arange(len(df_results)))]
+    months = df_results['date'].to_numpy().astype('datetime64[M]')
+    undated = np.isnat(months)
+    keys, inverse = np.unique(months[~undated], return_inverse=True)
+    positions = np.flatnonzero(~undated)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+    partitions = [
+        (str(key), positions[order[start:stop]])
+        for key, start, stop in zip(keys, bounds[:-1], bounds[1:])
+    ]
+    if undated.any():
+        partitions.append((UNDATED_PARTITION, np.flatnonzero(undated)))
+    return partitions
+
+
+def write_parts(store_dir, df_results, part_name, row_group_size=None):
+    """Write a results frame into the store as one part per month, returning the part paths
+
+    Paths are relative to store_dir. Each part is written to a temporary
+    name first and renamed, so readers never see a partial file.
+    """
+    parts = []
+    for month, rows in month_partitions(df_results):
+        relative = os.path.join(f"month={month}", f"{part_name}.parquet")
+        path = os.path.join(store_dir, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(df_results.take(rows), preserve_index=False)
+        pq.write_table(table, path + '.tmp', row_group_size=row_group_size)
+        os.replace(path + '.tmp', path)
+        parts.append(relative)
+    return parts
+
+
+def remove_parts(store_dir, parts):
+    """Delete parts (relative paths) from the store, ignoring ones already gone"""
+    for relative in parts:
+        path = os.path.join(store_dir, relative)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# History
+
+def load_runs(store_dir):
+    """Read a history store's manifest, or an empty one"""
+    path = os.path.join(store_dir, RUNS_FILE)
+    if not os.path.exists(path):
+        return {'entity_col': None, 'runs': [], 'parts': []}
+    with open(path) as runs_file:
+        return json.load(runs_file)
+
+
+def _save_runs(store_dir, manifest):
+    """Write the manifest atomically"""
+    path = os.path.join(store_dir, RUNS_FILE)
+    with open(path + '.tmp', 'w') as runs_file:
+        json.dump(manifest, runs_file, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def latest_dates(store_dir):
+    """Return the latest stored date per source and entity, indexed by (source, entity)
+
+    Both are '' when missing: runs without a source, or a store without an
+    entity column.
+    """
+    path = os.path.join(store_dir, LATEST_FILE)
+    if not os.path.exists(path):
+        index = pd.MultiIndex.from_arrays([[], []], names=['source', 'entity'])
+        return pd.Series([], index=index, dtype='datetime64[ns]')
+    latest = pq.read_table(path)
+    entities = latest['entity'].to_pylist()
+    sources = latest['source'].to_pylist() if 'source' in latest.column_names else [''] * len(entities)
+    index = pd.MultiIndex.from_arrays([sources, entities], names=['source', 'entity'])
+    return pd.Series(latest['date'].to_numpy(), index=index)
+
+
+def _save_latest(store_dir, latest):
+    """Write the latest date per source and entity atomically"""
+    path = os.path.join(store_dir, LATEST_FILE)
+    table = pa.table({
+        'source': pa.array(latest.index.get_level_values('source').to_numpy(), pa.string()),
+        'entity': pa.array(latest.index.get_level_values('entity').to_numpy(), pa.string()),
+        'date': pa.array(latest.to_numpy().astype('datetime64[ns]'))
+    })
+    pq.write_table(table, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def _save_schema(store_dir, schema):
+    """Merge a part's schema into the store's common schema"""
+    path = os.path.join(store_dir, SCHEMA_FILE)
+    if os.path.exists(path):
+        schema = pa.unify_schemas([pq.read_schema(path), schema], promote_options='permissive')
+    pq.write_metadata(schema, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def _period_order(df, entity_col):
+    """Return rows sorted by entity (if any), date and run, as the history stores them"""
+    keys = [df[RUN_COLUMN].to_numpy(), df['date'].to_numpy()]
+    if entity_col is not None:
+        keys.append(df[entity_col].to_numpy())
+    order = np.lexsort(keys)
+    if np.all(order[1:] > order[:-1]):
+        return df.reset_index(drop=True)
+    return df.take(order).reset_index(drop=True)
+
+
+def _month_of(part):
+    """Return the month label of a part's relative path"""
+    return os.path.dirname(part).split('=', 1)[1]
+
+
+def _compact(store_dir, manifest, months, name):
+    """Merge the parts of months with more than MAX_MONTH_PARTS parts into one sorted file each
+
+    Returns the replaced parts; they are deleted once the manifest no
+    longer lists them.
+    """
+    replaced = []
+    for month in months:
+        parts = [part for part in manifest['parts'] if _month_of(part) == month]
+        if len(parts) <= MAX_MONTH_PARTS:
+            continue
+        df = read_history(store_dir, manifest, parts=parts)
+        merged = write_parts(store_dir, _period_order(df, manifest['entity_col']), name, HISTORY_ROW_GROUP_ROWS)
+        manifest['parts'] = [part for part in manifest['parts'] if part not in parts] + merged
+        replaced += parts
+    return replaced
+
+
+def _drop_source(store_dir, manifest, source, name):
+    """Rewrite the parts holding rows of a source without them
+
+    Returns the replaced parts; they are deleted once the manifest no
+    longer lists them.
+    """
+    held = []
+    for part in manifest['parts']:
+        path = os.path.join(store_dir, part)
+        if SOURCE_COLUMN not in pq.read_schema(path).names:
+            continue
+        sources = pq.read_table(path, columns=[SOURCE_COLUMN])[SOURCE_COLUMN]
+        if pc.any(pc.equal(sources, source)).as_py():
+            held.append(part)
+    if not held:
+        return []
+    df = read_history(store_dir, manifest, parts=held)
+    kept = df[df[SOURCE_COLUMN].to_numpy() != source].reset_index(drop=True)
+    kept_parts = []
+    if len(kept):
+        kept_parts = write_parts(store_dir, _period_order(kept, manifest['entity_col']), name, HISTORY_ROW_GROUP_ROWS)
+    manifest['parts'] = [part for part in manifest['parts'] if part not in held] + kept_parts
+    return held
+
+
+def append_run(store_dir, df_results, entity_col=None, source=None, replace=False):
+    """Append a scored upload to the history as a new run, keeping only new dates
+
+    Rows dated after the latest date stored from the same source for their
+    entity (for the whole source without an entity column) are appended;
+    the rest, and rows without a date, are skipped. With replace=True the
+    rows stored from the source are removed first, so every dated row is
+    appended. Returns the run's manifest record.
+    """
+    if 'date' not in df_results.columns:
+        raise ValueError("Results need a date column to be kept in the history")
+    if entity_col is not None and entity_col not in df_results.columns:
+        entity_col = None
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = load_runs(store_dir)
+    if manifest['runs'] and manifest['entity_col'] != entity_col:
+        raise ValueError(f"History is kept per {manifest['entity_col'] or 'file'}, not per {entity_col or 'file'}")
+
+    run = manifest['runs'][-1]['run'] + 1 if manifest['runs'] else 1
+    source_key = '' if source is None else str(source)
+    latest = latest_dates(store_dir)
+    replaced = []
+    if replace:
+        replaced = _drop_source(store_dir, manifest, source_key, f"replace-{run:06d}")
+        latest = latest[latest.index.get_level_values('source') != source_key]
+
+    # Compare each row's date with the latest date stored from this source for its entity
+    if entity_col is None:
+        entities = pd.Categorical.from_codes(np.zeros(len(df_results), dtype=np.int8), categories=[''])
+    else:
+        entities = pd.Categorical(df_results[entity_col].astype(str))
+    stamps = df_results['date'].to_numpy().astype('datetime64[ns]').view(np.int64)
+    # NaT is the smallest int64, so any date is newer than a missing one and a missing date is never new
+    keys = pd.MultiIndex.from_product([[source_key], entities.categories], names=['source', 'entity'])
+    previous = latest.reindex(keys).to_numpy().astype('datetime64[ns]').view(np.int64)
+    new = stamps > previous[entities.codes]
+
+    df_new = df_results[new].reset_index(drop=True)
+    if entity_col is not None:
+        df_new[entity_col] = np.asarray(entities[new], dtype=object)
+    df_new[RUN_COLUMN] = np.full(len(df_new), run, dtype=np.int32)
+    df_new[SOURCE_COLUMN] = np.full(len(df_new), source_key, dtype=object)
+    df_new = _period_order(df_new, entity_col)
+
+    parts = write_parts(store_dir, df_new, f"run-{run:06d}", HISTORY_ROW_GROUP_ROWS) if len(df_new) else []
+    if parts:
+        _save_schema(store_dir, pq.read_schema(os.path.join(store_dir, parts[0])))
+    manifest['entity_col'] = entity_col
+    manifest['parts'] += parts
+    record = {
+        'run': run,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'source': source,
+        'rows': int(new.sum()),
+        'skipped': int(len(new) - new.sum()),
+        'replaced': bool(replace)
+    }
+    manifest['runs'].append(record)
+    replaced += _compact(store_dir, manifest, sorted({_month_of(part) for part in parts}), f"compact-{run:06d}")
+    _save_runs(store_dir, manifest)
+    remove_parts(store_dir, replaced)
+
+    if len(df_new) or replace:
+        newest = pd.Series(stamps[new]).groupby(np.asarray(entities[new], dtype=object)).max()
+        newest.index = pd.MultiIndex.from_product([[source_key], newest.index], names=['source', 'entity'])
+        latest = pd.concat([latest[~latest.index.isin(newest.index)], newest.astype('datetime64[ns]')])
+        _save_latest(store_dir, latest)
+    return record
+
+
+def _parts_between(parts, start=None, end=None):
+    """Return the parts of the months from start to end (dates or None)"""
+    if start is not None:
+        parts = [part for part in parts if _month_of(part) >= pd.Timestamp(start).strftime('%Y-%m')]
+    if end is not None:
+        parts = [part for part in parts if _month_of(part) <= pd.Timestamp(end).strftime('%Y-%m')]
+    return parts
+
+
+def _history_dataset(store_dir, parts):
+    """Open history parts as one dataset with the store's common schema"""
+    schema = pq.read_schema(os.path.join(store_dir, SCHEMA_FILE))
+    return ds.dataset([os.path.join(store_dir, part) for part in parts], schema=schema, format='parquet')
+
+
+@functools.lru_cache(maxsize=4096)
+def _row_group_ranges(path, mtime_ns, column):
+    """Return a part's footer and the (min, max) of a column in each of its row groups
+
+    Parts are never modified once written, so footers are cached by path and
+    modification time.
+    """
+    metadata = pq.read_metadata(path)
+    index = metadata.schema.to_arrow_schema().get_field_index(column)
+    ranges = []
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(index).statistics
+        has_range = statistics is not None and statistics.has_min_max
+        ranges.append((statistics.min, statistics.max) if has_range else (None, None))
+    return metadata, ranges
+
+
+def _results_frame(table):
+    """Convert a history table to a results frame with STATUS_DTYPE status columns"""
+    df = table.to_pandas()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype) and set(df[col].cat.categories) <= set(STATUS_LABELS):
+            df[col] = df[col].astype(STATUS_DTYPE)
+    return df
+
+
+def read_history(store_dir, manifest=None, condition=None, parts=None, start=None, end=None):
+    """Read history rows matching a pyarrow.dataset condition as a results frame"""
+    manifest = load_runs(store_dir) if manifest is None else manifest
+    parts = _parts_between(manifest['parts'] if parts is None else parts, start, end)
+    if not parts:
+        return pd.DataFrame()
+    return _results_frame(_history_dataset(store_dir, parts).to_table(filter=condition))
+
+
+def entity_history(store_dir, entity=None, start=None, end=None):
+    """Return one entity's stored rows in date order, optionally between start and end dates
+
+    Parts are sorted by entity, so only the row groups whose entity range
+    covers the entity are read. entity is ignored for a history kept
+    without an entity column.
+    """
+    manifest = load_runs(store_dir)
+    entity_col = manifest['entity_col']
+    if entity_col is None:
+        df = read_history(store_dir, manifest, start=start, end=end)
+    else:
+        entity = str(entity)
+        tables = []
+        for part in _parts_between(manifest['parts'], start, end):
+            path = os.path.join(store_dir, part)
+            metadata, ranges = _row_group_ranges(path, os.stat(path).st_mtime_ns, entity_col)
+            groups = [i for i, (low, high) in enumerate(ranges) if low is None or low <= entity <= high]
+            if groups:
+                tables.append(pq.ParquetFile(path, metadata=metadata).read_row_groups(groups, use_threads=False))
+        if not tables:
+            return pd.DataFrame()
+        table = pa.concat_tables(tables, promote_options='permissive')
+        df = _results_frame(table.filter(pc.equal(table[entity_col], entity)))
+    if df.empty:
+        return df
+    keep = np.ones(len(df), dtype=bool)
+    if start is not None:
+        keep &= df['date'].to_numpy() >= pd.Timestamp(start).to_datetime64()
+    if end is not None:
+        keep &= df['date'].to_numpy() <= pd.Timestamp(end).to_datetime64()
+    df = df[keep]
+    return df.sort_values(['date', RUN_COLUMN], kind='stable').reset_index(drop=True)
+
+
+def _latest_rows(df, entity_col):
+    """Return each entity's latest row (by date, then run)"""
+    df = _period_order(df, entity_col)
+    if entity_col is None:
+        return df.tail(1).reset_index(drop=True)
+    last = np.ones(len(df), dtype=bool)
+    entities = df[entity_col].to_numpy()
+    last[:-1] = entities[1:] != entities[:-1]
+    return df[last].reset_index(drop=True)
+
+
+def status_transitions(store_dir, run_a=None, run_b=None):
+    """List the status changes between the history as of run_a and as of run_b
+
+    For each entity with rows appended after run_a up to run_b, its latest
+    statuses after run_b are compared with its latest statuses after run_a;
+    only changed statuses are listed, one row per entity and status column.
+    Entities first seen after run_a have nothing to compare against and are
+    left out. Defaults to the last two runs.
+    """
+    manifest = load_runs(store_dir)
+    entity_col = manifest['entity_col']
+    runs = [record['run'] for record in manifest['runs']]
+    run_b = runs[-1] if run_b is None and runs else run_b
+    run_a = max((run for run in runs if run < run_b), default=None) if run_a is None and run_b is not None else run_a
+    columns = ([entity_col] if entity_col else []) + ['Status', 'From', 'To', 'From_Date', 'To_Date', 'Worsened']
+    if run_a is None or run_b is None or run_b <= run_a:
+        return pd.DataFrame(columns=columns)
+
+    run = ds.field(RUN_COLUMN)
+    after = read_history(store_dir, manifest, (run > run_a) & (run <= run_b))
+    if after.empty:
+        return pd.DataFrame(columns=columns)
+    after = _latest_rows(after, entity_col)
+    # Read months newest first until every entity's latest earlier row is found
+    found = []
+    remaining = after[entity_col].to_numpy() if entity_col is not None else None
+    for month in sorted({_month_of(part) for part in manifest['parts']}, reverse=True):
+        condition = run <= run_a
+        if entity_col is not None:
+            condition &= ds.field(entity_col).isin(pa.array(remaining, pa.string()))
+        month_parts = [part for part in manifest['parts'] if _month_of(part) == month]
+        rows = read_history(store_dir, manifest, condition, parts=month_parts)
+        if rows.empty:
+            continue
+        found.append(rows)
+        if entity_col is None:
+            break
+        remaining = remaining[~pd.Index(remaining).isin(rows[entity_col])]
+        if not len(remaining):
+            break
+    if not found:
+        return pd.DataFrame(columns=columns)
+    before = _latest_rows(pd.concat(found, ignore_index=True), entity_col)
+
+    # Line up each entity's latest rows before and after
+    if entity_col is not None:
+        positions = pd.Index(before[entity_col]).get_indexer(after[entity_col])
+        after = after[positions >= 0].reset_index(drop=True)
+        before = before.take(positions[positions >= 0]).reset_index(drop=True)
+    else:
+        after, before = after.tail(1), before.tail(1)
+
+    changes = []
+    for col in status_columns(after):
+        if col not in before.columns:
+            continue
+        old = before[col].cat.codes.to_numpy()
+        new = after[col].cat.codes.to_numpy()
+        changed = np.flatnonzero((old != new) & (old >= 0) & (new >= 0))
+        if not len(changed):
+            continue
+        change = {entity_col: after[entity_col].to_numpy()[changed]} if entity_col else {}
+        change.update({
+            'Status': col,
+            'From': before[col].to_numpy()[changed],
+            'To': after[col].to_numpy()[changed],
+            'From_Date': before['date'].to_numpy()[changed],
+            'To_Date': after['date'].to_numpy()[changed],
+            'Worsened': new[changed] > old[changed]
+        })
+        changes.append(pd.DataFrame(change))
+    if not changes:
+        return pd.DataFrame(columns=columns)
+    transitions = pd.concat(changes, ignore_index=True)
+    for col in ('From', 'To'):
+        transitions[col] = pd.Categorical(transitions[col], dtype=STATUS_DTYPE)
+    sort_keys = ([entity_col] if entity_col else []) + ['Status']
+    return transitions.sort_values(sort_keys, kind='stable').reset_index(drop=True)
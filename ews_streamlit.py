@@ -1,127 +1,83 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
 from datetime import datetime
-import io
+import copy
+import os
+import tempfile
 
-def load_and_process_csv(uploaded_file):
-    """Load and process the uploaded CSV file"""
-    df = pd.read_csv(uploaded_file)
-    
-    # Convert date column if exists
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'])
-    
-    return df
+from ews_engine import (
+    COMPOSITE_WEIGHTS,
+    DEFAULT_THRESHOLDS,
+    METRIC_COLUMNS,
+    RATING_STATUS_COLUMN,
+    SCORE_COLUMN,
+    STATUS_LABELS,
+    WORST_COLUMN,
+    add_composite,
+    add_streaks,
+    calculate_all_metrics,
+    classify_ratios,
+    count_statuses,
+    daily_totals,
+    period_rollups,
+    rating_status,
+    ratio_frame,
+    score_chunks,
+    streak_status,
+    streak_summary,
+    status_columns,
+    status_labels,
+    summary_status_counts,
+    summary_trend,
+    thresholds_key,
+    top_risk,
+    validate_thresholds,
+    validate_weights,
+    value_columns
+)
+from ews_arrow import BACKENDS, score_arrow
+from ews_cache import ResultCache, content_hash
+from ews_export import EXPORT_FORMATS, export_bytes, iter_frame_chunks, iter_results_csv
+from ews_charts import (
+    MAX_TREND_POINTS,
+    create_charts,
+    create_period_status_chart,
+    create_score_chart,
+    create_sweep_chart,
+    score_distribution
+)
+from ews_groups import DEFAULT_ENTITY_COLUMN, entity_rollup, entity_trend, latest_row_mask, sort_by_entity
+from ews_io import FILE_FORMATS, iter_file_chunks, load_file, load_table
+from ews_parallel import score_shared, use_shared
+from ews_store import HISTORY_DIR, append_run, entity_history, load_runs, status_transitions
+from ews_sweep import MAX_AXIS_VALUES, band_edges, edge_name, sweep, sweep_axis, sweep_table
 
-def calculate_all_metrics(row, step_values):
-    """Calculate all EWS metrics for a single row"""
-    results = {}
-    
-    # PVR Calculation
-    if 'actual_volume' in row and 'target_volume' in row:
-        actual = row['actual_volume'] * step_values['procurement']
-        target = row['target_volume'] * step_values['procurement']
-        pvr = (actual / target * 100) if target != 0 else 0
-        results['PVR'] = 'Green' if pvr >= 50 else 'Red'
-        results['PVR_Value'] = pvr
-    
-    # ILR Calculation
-    if 'actual_inventory' in row and 'planned_inventory' in row:
-        actual = row['actual_inventory'] * step_values['inventory']
-        planned = row['planned_inventory'] * step_values['inventory']
-        ilr = (actual / planned * 100) if planned != 0 else 0
-        if ilr <= 120:
-            results['ILR'] = 'Green'
-        elif ilr <= 150:
-            results['ILR'] = 'Yellow'
-        elif ilr <= 170:
-            results['ILR'] = 'Orange'
-        else:
-            results['ILR'] = 'Red'
-        results['ILR_Value'] = ilr
-    
-    # OLR Calculation
-    if 'outstanding_loan_other' in row and 'credit_limit' in row:
-        loan = row['outstanding_loan_other'] * step_values['loan']
-        limit = row['credit_limit'] * step_values['loan']
-        olr = (loan / limit * 100) if limit != 0 else 0
-        if olr <= 15:
-            results['OLR'] = 'Green'
-        elif olr <= 25:
-            results['OLR'] = 'Yellow'
-        else:
-            results['OLR'] = 'Orange'
-        results['OLR_Value'] = olr
-    
-    # CLR Calculation
-    if 'cash_balance' in row and 'loan_amount' in row:
-        cash = row['cash_balance'] * step_values['balance']
-        loan = row['loan_amount'] * step_values['balance']
-        clr = (cash / loan * 100) if loan != 0 else 0
-        results['CLR'] = 'Green' if clr >= 80 else 'Red'
-        results['CLR_Value'] = clr
-    
-    # ABR Calculation
-    if 'account_balance' in row and 'loan_amount' in row:
-        balance = row['account_balance'] * step_values['balance']
-        loan = row['loan_amount'] * step_values['balance']
-        abr = (balance / loan * 100) if loan != 0 else 0
-        results['ABR'] = 'Green' if abr >= 100 else 'Orange'
-        results['ABR_Value'] = abr
-    
-    return results
+# Display names of the manual credit rating choices
+RATING_LABELS = {'Good': "Good (No Change)", 'Dropped': "Dropped from Previous"}
 
-def create_summary_charts(df_results):
-    """Create summary charts from results DataFrame"""
-    charts = []
-    
-    # Status Distribution Chart
-    status_cols = [col for col in df_results.columns if not col.endswith('_Value') and col != 'date']
-    for metric in status_cols:
-        status_counts = df_results[metric].value_counts()
-        fig = go.Figure(data=[
-            go.Bar(
-                x=status_counts.index,
-                y=status_counts.values,
-                marker_color=['green' if x == 'Green' else 
-                            'yellow' if x == 'Yellow' else
-                            'orange' if x == 'Orange' else 'red' 
-                            for x in status_counts.index]
-            )
-        ])
-        fig.update_layout(
-            title=f"{metric} Status Distribution",
-            xaxis_title="Status",
-            yaxis_title="Count",
-            showlegend=False
-        )
-        charts.append(fig)
+# Uploads larger than this are scored in streaming mode by default
+STREAMING_THRESHOLD_BYTES = 200 * 1024 * 1024
+
+def load_and_process_csv(uploaded_file, date_range=None, stats=None, extra_columns=()):
+    """Load and process the uploaded CSV, Parquet or Arrow IPC file"""
+    return load_file(uploaded_file, uploaded_file.name, date_range, stats, extra_columns)
+
+def results_trend(df_results, entity_col=None):
+    """Return the date and ratio columns of a results DataFrame, or None without dates
     
-    # Trend Analysis Chart
-    value_cols = [col for col in df_results.columns if col.endswith('_Value')]
+    With several entities the ratios are averaged per date.
+    """
+    value_cols = value_columns(df_results)
     if 'date' in df_results.columns and value_cols:
-        fig = go.Figure()
-        for col in value_cols:
-            metric_name = col.replace('_Value', '')
-            fig.add_trace(go.Scatter(
-                x=df_results['date'],
-                y=df_results[col],
-                name=metric_name,
-                mode='lines+markers'
-            ))
-        fig.update_layout(
-            title="Metrics Trend Over Time",
-            xaxis_title="Date",
-            yaxis_title="Value (%)",
-            showlegend=True
-        )
-        charts.append(fig)
-    
-    return charts
+        trend = df_results[['date'] + value_cols].astype({col: 'float64' for col in value_cols})
+        if entity_col is not None and entity_col in df_results.columns:
+            trend = trend.groupby('date')[value_cols].mean().reset_index()
+        return trend
+    return None
 
-def manual_input_tab(step_values):
+def manual_input_tab(step_values, thresholds, period_days):
     """Handle manual input tab functionality"""
     col1, col2 = st.columns(2)
     
@@ -152,10 +108,11 @@ def manual_input_tab(step_values):
         st.markdown(f"Target Value: {target_volume:,.2f}")
         
         pvr_periods = st.number_input(
-            "Consecutive Low PVR Periods",
+            f"Consecutive Low PVR Periods ({period_days['PVR']}-day periods)",
             min_value=0,
             max_value=10,
-            value=0
+            value=0,
+            help=f"Number of consecutive {period_days['PVR']}-day periods in which PVR was Red"
         )
         
         # Inventory Level Section
@@ -238,17 +195,19 @@ def manual_input_tab(step_values):
         st.markdown(f"Account Balance Value: {account_balance:,.2f}")
         
         clr_periods = st.number_input(
-            "Consecutive Low CLR Periods",
+            f"Consecutive Low CLR Periods ({period_days['CLR']}-day periods)",
             min_value=0,
             max_value=10,
-            value=0
+            value=0,
+            help=f"Number of consecutive {period_days['CLR']}-day periods in which CLR was Red"
         )
         
         # Credit Rating Section
         st.markdown("### 5. Credit Rating")
         credit_rating = st.selectbox(
             "Current Credit Rating",
-            ["Good (No Change)", "Dropped from Previous", "B1", "B2", "B3", "Bad Debt"]
+            ["Good", "Dropped", "B1", "B2", "B3", "Bad Debt"],
+            format_func=lambda rating: RATING_LABELS.get(rating, rating)
         )
     
     with col2:
@@ -268,17 +227,14 @@ def manual_input_tab(step_values):
         }
         
         # Calculate results
-        results = calculate_all_metrics(row_data, step_values)
+        results = calculate_all_metrics(row_data, step_values, thresholds)
         
-        # Add credit rating status
-        if credit_rating == "Good (No Change)":
-            results['Credit Rating'] = "Green"
-        elif credit_rating == "Dropped from Previous":
-            results['Credit Rating'] = "Yellow"
-        elif credit_rating in ["B1", "B2", "B3"]:
-            results['Credit Rating'] = "Orange"
-        elif credit_rating == "Bad Debt":
-            results['Credit Rating'] = "Red"
+        # Escalate on consecutive low periods
+        results['PVR_Streak'] = streak_status('PVR', pvr_periods)
+        results['CLR_Streak'] = streak_status('CLR', clr_periods)
+        
+        # Add credit rating status from the rule file's lookup table
+        results['Credit Rating'] = status_labels(rating_status([credit_rating])[0])[0]
         
         # Display results with colored boxes
         for metric, status in results.items():
@@ -309,11 +265,251 @@ def manual_input_tab(step_values):
             if metric.endswith('_Value'):
                 st.info(f"{metric.replace('_Value', '')}: {value:.2f}%")
 
-def csv_upload_tab(step_values):
+@st.cache_resource
+def get_result_cache():
+    """Return the result cache shared by all sessions"""
+    return ResultCache()
+
+def upload_digest(uploaded_file):
+    """Hash the uploaded file content once per upload"""
+    digests = st.session_state.setdefault('upload_digests', {})
+    if uploaded_file.file_id not in digests:
+        digests[uploaded_file.file_id] = content_hash(uploaded_file.getbuffer())
+    return digests[uploaded_file.file_id]
+
+def remove_results_file(entry):
+    """Delete the on-disk results of an evicted streaming cache entry"""
+    if os.path.exists(entry['path']):
+        os.remove(entry['path'])
+
+def score_upload(cache, uploaded_file, step_values, thresholds, period_days, streaming, date_range=None,
+                 entity_col=None, backend='numpy', weights=None):
+    """Score an upload, reusing cached frames, ratios and results from earlier reruns
+    
+    Ratios do not depend on step values or thresholds, so they are cached per
+    upload and only re-binned when the thresholds change. The returned entry
+    carries its cache key so exports can be cached alongside it. If the upload
+    has the entity column, rows are scored per entity in date order and the
+    entry includes a per-entity rollup. The arrow backend caches the Arrow
+    table instead and scores it with pyarrow.compute on every threshold change.
+    weights are the composite EWS score weights (the rule file's by default).
+    Daily, weekly, monthly and quarterly rollups are built with the results,
+    so switching the trend granularity does not rescore.
+    """
+    weights = COMPOSITE_WEIGHTS if weights is None else weights
+    digest = upload_digest(uploaded_file)
+    bands = thresholds_key(thresholds)
+    dates = tuple(str(bound) for bound in date_range) if date_range else None
+    periods = tuple(sorted(period_days.items()))
+    key = (
+        'stream' if streaming else 'results', digest, dates, bands, periods, entity_col, backend,
+        tuple(sorted(weights.items()))
+    )
+    extra_columns = (entity_col,) if entity_col else ()
+    
+    def load_frame():
+        uploaded_file.seek(0)
+        stats = {}
+        df = load_and_process_csv(uploaded_file, date_range, stats, extra_columns)
+        if entity_col and entity_col in df.columns:
+            df = sort_by_entity(df, entity_col)
+        return {'frame': df, 'parse': stats}
+    
+    def load_arrow_table():
+        uploaded_file.seek(0)
+        stats = {}
+        table = load_table(uploaded_file, uploaded_file.name, date_range, stats, extra_columns)
+        return {'table': table, 'parse': stats}
+    
+    def load_ratios():
+        loaded = cache.get_or_compute(('frame', digest, dates, entity_col), load_frame)
+        df = loaded['frame']
+        if entity_col not in df.columns and use_shared(len(df), os.cpu_count() or 1):
+            # Large single-entity frames are scored in parallel blocks over shared memory; their
+            # default-band statuses and the summary reduced from the blocks are kept with the ratios
+            scored_blocks, summary = score_shared(df, step_values)
+            df_ratios = scored_blocks.drop(columns=[col for col in (WORST_COLUMN, SCORE_COLUMN) if col in scored_blocks])
+            return {'ratios': df_ratios, 'summary': summary, 'parse': loaded['parse']}
+        return {'ratios': ratio_frame(df, entity_col), 'summary': None, 'parse': loaded['parse']}
+    
+    def score_in_memory():
+        shared, shared_counts = None, {}
+        if backend == 'arrow':
+            scored_ratios = cache.get_or_compute(('table', digest, dates, entity_col), load_arrow_table)
+            grouped = entity_col if entity_col in scored_ratios['table'].column_names else None
+            df_results = add_streaks(
+                score_arrow(scored_ratios['table'], thresholds, grouped, weights), period_days, grouped
+            )
+        else:
+            scored_ratios = cache.get_or_compute(('ratios', digest, dates, entity_col), load_ratios)
+            grouped = entity_col if entity_col in scored_ratios['ratios'].columns else None
+            shared = scored_ratios['summary']
+            if shared is not None and bands == thresholds_key(DEFAULT_THRESHOLDS):
+                # The blocks were binned in the default bands; only the composite is rebuilt
+                df_results = add_composite(scored_ratios['ratios'].copy(deep=False), weights)
+                shared_counts = shared['status_counts']
+            else:
+                df_results = classify_ratios(scored_ratios['ratios'], thresholds, weights)
+            df_results = add_streaks(df_results, period_days, grouped)
+        inputs = (
+            scored_ratios['table'] if backend == 'arrow'
+            else cache.get_or_compute(('frame', digest, dates, entity_col), load_frame)['frame']
+        )
+        return {
+            'key': key,
+            'rows': len(df_results),
+            'parse': scored_ratios['parse'],
+            'entity_col': grouped,
+            'rollup': entity_rollup(df_results, grouped) if grouped else None,
+            'streaks': streak_summary(df_results, grouped),
+            'results': df_results,
+            'status_counts': {
+                col: shared_counts[col] if col in shared_counts else count_statuses(df_results[col])
+                for col in status_columns(df_results)
+            },
+            'trend': summary_trend(shared) if shared is not None else results_trend(df_results, grouped),
+            'score_distribution': (
+                score_distribution(df_results[SCORE_COLUMN]) if SCORE_COLUMN in df_results.columns else None
+            ),
+            'rollups': period_rollups(daily_totals(inputs, df_results))
+        }
+    
+    def score_streaming():
+        # Score chunk by chunk, keeping only running aggregates in memory
+        fd, path = tempfile.mkstemp(prefix="ews_results_", suffix=".csv")
+        os.close(fd)
+        uploaded_file.seek(0)
+        chunks = iter_file_chunks(uploaded_file, uploaded_file.name, date_range=date_range, extra_columns=extra_columns)
+        summary = score_chunks(chunks, step_values, path, thresholds, weights, period_days, entity_col)
+        return {
+            'key': key,
+            'rows': summary['rows'],
+            'path': path,
+            'unordered': summary['unordered'],
+            'streaks': summary['streaks'],
+            'status_counts': summary_status_counts(summary),
+            'trend': summary_trend(summary),
+            'rollups': period_rollups(summary['daily'])
+        }
+    
+    if streaming:
+        return cache.get_or_compute(key, score_streaming, on_evict=remove_results_file)
+    return cache.get_or_compute(key, score_in_memory)
+
+def parse_report(stats):
+    """Show parsing throughput and any rejected rows"""
+    megabytes = stats['bytes'] / (1024 * 1024)
+    throughput = megabytes / stats['seconds'] if stats['seconds'] > 0 else float('inf')
+    st.caption(
+        f"Parsed {megabytes:,.1f} MB in {stats['seconds']:.2f}s "
+        f"({throughput:,.1f} MB/s, {stats['engine']} reader)"
+    )
+    
+    if stats.get('rejected_count'):
+        st.warning(f"Rejected {stats['rejected_count']:,} malformed rows")
+        with st.expander("Rejected Rows"):
+            st.dataframe(pd.DataFrame(stats['rejected']), use_container_width=True)
+
+def build_export(scored, export_format):
+    """Build an export of a scored entry, reading streamed results back from disk in chunks"""
+    if 'path' in scored:
+        return export_bytes(iter_results_csv(scored['path']), export_format)
+    return export_bytes(iter_frame_chunks(scored['results']), export_format)
+
+def cache_settings(cache):
+    """Show cache counters and let the user change the byte budget"""
+    with st.expander("Result Cache"):
+        budget_mb = st.number_input(
+            "Cache Budget (MB)",
+            min_value=64,
+            value=cache.max_bytes // (1024 * 1024),
+            step=256,
+            help="Memory available for cached uploads, results and exports; least recently used entries are evicted first"
+        )
+        if budget_mb * 1024 * 1024 != cache.max_bytes:
+            cache.resize(budget_mb * 1024 * 1024)
+        
+        stats = cache.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Hits", stats['hits'])
+        col2.metric("Misses", stats['misses'])
+        col3.metric("Entries", stats['entries'])
+        col4.metric("Used (MB)", f"{stats['bytes'] / (1024 * 1024):,.1f}")
+
+def sweep_edge_input(thresholds, edges, label, key, optional=False):
+    """Let the user pick a band edge and a range of values to sweep it over, returning a sweep axis"""
+    choices = ([None] if optional else []) + edges
+    edge = st.selectbox(
+        label,
+        choices,
+        format_func=lambda choice: "None" if choice is None else edge_name(thresholds, *choice),
+        key=f"{key}_edge"
+    )
+    if edge is None:
+        return None
+    current = float(thresholds[edge[0]]['edges'][edge[1]])
+    spread = max(abs(current) * 0.2, 1.0)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        start = st.number_input("From", value=current - spread, key=f"{key}_start_{edge}")
+    with col2:
+        stop = st.number_input("To", value=current + spread, key=f"{key}_stop_{edge}")
+    with col3:
+        steps = st.number_input("Steps", min_value=1, max_value=MAX_AXIS_VALUES, value=50, key=f"{key}_steps_{edge}")
+    return sweep_axis(thresholds, edge[0], edge[1], np.linspace(start, stop, int(steps)))
+
+def sensitivity_sweep(cache, scored, thresholds):
+    """Sweep one or two band edges over the cached ratios and show the status counts per configuration"""
+    df_results = scored['results']
+    edges = [
+        (metric, edge) for metric, edge in band_edges(thresholds) if f'{metric}_Value' in df_results.columns
+    ]
+    if not edges:
+        return
+    
+    with st.expander("Sensitivity Sweep"):
+        st.caption(
+            "Counts the statuses of every combination of band edge values without rescoring; "
+            "the other edges keep their configured values and streaks are not recounted"
+        )
+        first = sweep_edge_input(thresholds, edges, "Edge", "sweep_first")
+        second = sweep_edge_input(
+            thresholds, [edge for edge in edges if edge != (first['metric'], first['edge'])],
+            "Second Edge (optional)", "sweep_second", optional=True
+        )
+        axes = [first] + ([second] if second is not None else [])
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            target = st.selectbox("Status Of", [WORST_COLUMN, *dict.fromkeys(axis['metric'] for axis in axes)])
+        with col2:
+            status = st.selectbox("Count", STATUS_LABELS, index=len(STATUS_LABELS) - 1)
+        with col3:
+            borrowers = False
+            if scored.get('entity_col'):
+                borrowers = st.toggle("Latest row per borrower", help="Count borrowers by their latest row instead of all rows")
+        
+        if not st.button("Run Sweep"):
+            return
+        axes_key = tuple((axis['metric'], axis['edge'], tuple(axis['values'])) for axis in axes)
+        
+        def run_sweep():
+            rows = latest_row_mask(df_results, scored['entity_col']) if borrowers else None
+            return sweep(df_results, axes, thresholds, target, rows)
+        
+        counts = cache.get_or_compute(('sweep', target, axes_key, borrowers) + scored['key'], run_sweep)
+        st.plotly_chart(create_sweep_chart(counts, axes, thresholds, status, target), use_container_width=True)
+        st.dataframe(sweep_table(counts, axes, thresholds), use_container_width=True, hide_index=True)
+
+def csv_upload_tab(step_values, thresholds, period_days, weights=None):
     """Handle CSV upload tab functionality"""
     st.markdown("### Upload Data")
     # Add a key to the file_uploader to force clear on new upload
-    uploaded_file = st.file_uploader("Upload CSV file", type=['csv'], key="csv_uploader")
+    uploaded_file = st.file_uploader(
+        "Upload CSV, Parquet or Arrow file",
+        type=[extension.lstrip('.') for extension in FILE_FORMATS],
+        key="csv_uploader"
+    )
     
     # Clear all states if file uploader is empty (user clicked clear)
     if uploaded_file is None:
@@ -329,8 +525,43 @@ def csv_upload_tab(step_values):
     - actual_inventory, planned_inventory
     - outstanding_loan_other, credit_limit
     - cash_balance, loan_amount, account_balance
+    
+    - borrower_id (optional, scores and ranks each borrower separately)
+    - credit_rating (optional: Good, B1, B2, B3 or Bad Debt; a rating worse
+      than the borrower's previous period is at least Yellow)
+    
+    Parquet and Arrow IPC (Feather) files with the same column names are also
+    accepted; only these columns are read.
     """)
     
+    entity_col = st.text_input(
+        "Entity Column",
+        value=DEFAULT_ENTITY_COLUMN,
+        help="Column identifying each borrower; leave empty to score the file as one entity"
+    ).strip() or None
+    
+    date_range = st.date_input(
+        "Date Range (optional)",
+        value=[],
+        help="Only score rows in this range; Parquet row groups outside it are skipped"
+    )
+    date_range = tuple(date_range) if len(date_range) == 2 else None
+    
+    backend = st.selectbox(
+        "Scoring Backend",
+        BACKENDS,
+        help="arrow scores the Arrow table with pyarrow.compute kernels; results are identical"
+    )
+    
+    streaming = st.toggle(
+        "Streaming mode",
+        value=uploaded_file.size > STREAMING_THRESHOLD_BYTES,
+        help=(
+            "Score the file in chunks with bounded memory and write per-row results to disk; "
+            "Red period streaks carry across chunks, so rows must be in date order"
+        )
+    )
+    
     if uploaded_file is not None:
         try:
             # Clear previous results from session state
@@ -338,52 +569,163 @@ def csv_upload_tab(step_values):
                 if key.startswith('results_'):
                     del st.session_state[key]
             
-            # Process new file
-            df = load_and_process_csv(uploaded_file)
-            
             # Store current file name in session state
             st.session_state.current_file = uploaded_file.name
             
-            # Calculate metrics for each row
-            results_list = []
-            for _, row in df.iterrows():
-                results = calculate_all_metrics(row, step_values)
-                if 'date' in df.columns:
-                    results['date'] = row['date']
-                results_list.append(results)
-            
-            df_results = pd.DataFrame(results_list)
+            cache = get_result_cache()
+            scored = score_upload(
+                cache, uploaded_file, step_values, thresholds, period_days, streaming, date_range, entity_col,
+                backend, weights
+            )
+            status_counts = scored['status_counts']
+            trend = scored['trend']
+            if streaming:
+                st.caption(
+                    f"Scored {scored['rows']:,} rows in streaming mode; "
+                    "switch it off for the borrower queue and per-borrower trends"
+                )
+                if scored['unordered']:
+                    st.warning(
+                        f"{scored['unordered']:,} times a borrower's dates went back between chunks; "
+                        "streaks and rating drops are only carried forward in date order, "
+                        "so sort the file by date or score it in memory"
+                    )
+            else:
+                parse_report(scored['parse'])
             
             # Display summary statistics
             st.markdown("### Summary Statistics")
             
             # Status distribution
-            status_cols = [col for col in df_results.columns if not col.endswith('_Value') and col != 'date']
-            for metric in status_cols:
+            for metric, counts in status_counts.items():
                 st.write(f"#### {metric} Distribution")
-                status_counts = df_results[metric].value_counts()
-                st.write(status_counts)
+                st.write(counts)
+            
+            # Consecutive low periods
+            if scored.get('streaks'):
+                st.write("#### Consecutive Red Periods")
+                columns = st.columns(len(scored['streaks']))
+                for column, (metric, runs) in zip(columns, scored['streaks'].items()):
+                    column.metric(
+                        f"{metric} Current Run ({period_days[metric]}-day periods)",
+                        runs['current'],
+                        help=f"Longest run: {runs['max']}"
+                    )
+            
+            # Riskiest rows by the composite status and score
+            if scored.get('results') is not None and WORST_COLUMN in scored['results'].columns:
+                st.markdown("### Top Risks")
+                top_n = st.number_input("Rows shown", min_value=1, max_value=10_000, value=20, step=10)
+                st.dataframe(top_risk(scored['results'], int(top_n)), use_container_width=True, hide_index=True)
+            
+            # Per-borrower analyst queue
+            if scored.get('rollup') is not None:
+                rollup = scored['rollup']
+                st.markdown("### Borrower Queue")
+                st.caption(f"{len(rollup):,} borrowers, worst status first")
+                st.dataframe(rollup, use_container_width=True, hide_index=True)
             
             # Create and display charts
             st.markdown("### Visualization")
-            charts = create_summary_charts(df_results)
+            granularity = 'Raw'
+            if scored.get('rollups'):
+                granularity = st.selectbox(
+                    "Trend Granularity",
+                    ['Raw', *scored['rollups']],
+                    help="Period ratios are summed numerators over summed denominators; rollups are precomputed with the results"
+                )
+            rollup_frame = None
+            if granularity != 'Raw':
+                rollup_frame = scored['rollups'][granularity]
+                trend = rollup_frame[['date', *value_columns(rollup_frame)]]
+            window = None
+            if trend is not None and len(trend) > MAX_TREND_POINTS:
+                first, last = (date.to_pydatetime() for date in pd.to_datetime(trend['date']).agg(['min', 'max']))
+                window = st.slider(
+                    "Trend Window",
+                    min_value=first,
+                    max_value=last,
+                    value=(first, last),
+                    format="YYYY-MM-DD",
+                    help="Narrow the window to see the trend in finer detail"
+                )
+            charts = create_charts(status_counts, trend, window)
+            if rollup_frame is not None:
+                charts[-1].update_layout(title=f"{granularity} Metrics Trend")
+                charts.append(create_period_status_chart(rollup_frame, granularity))
+            
+            if scored.get('score_distribution') is not None:
+                charts.append(create_score_chart(scored['score_distribution']))
             
             for chart in charts:
                 st.plotly_chart(chart, use_container_width=True)
             
+            if rollup_frame is not None:
+                with st.expander(f"{granularity} Rollup"):
+                    st.dataframe(rollup_frame, use_container_width=True, hide_index=True)
+            
+            if scored.get('rollup') is not None and len(scored['rollup']):
+                entity = st.selectbox(
+                    "Borrower Trend",
+                    scored['rollup'][scored['entity_col']],
+                    help="Borrowers are listed in queue order"
+                )
+                entity_charts = create_charts({}, entity_trend(scored['results'], scored['entity_col'], entity), window)
+                for chart in entity_charts:
+                    chart.update_layout(title=f"{entity} Metrics Trend Over Time")
+                    st.plotly_chart(chart, use_container_width=True)
+            
+            # Band edge sensitivity over the cached ratios
+            if scored.get('results') is not None:
+                sensitivity_sweep(cache, scored, thresholds)
+            
             # Export results
             st.markdown("### Export Results")
-            if st.button("Export Results"):
-                output = io.BytesIO()
-                df_results.to_excel(output, index=False, engine='openpyxl')
-                output.seek(0)
+            export_format = st.selectbox(
+                "Export Format",
+                list(EXPORT_FORMATS),
+                help="Excel splits across sheets past 1,048,576 rows; gzip CSV and Parquet are much faster for large results"
+            )
+            extension, mime = EXPORT_FORMATS[export_format]
+            file_name = f"ews_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+            if streaming and export_format == 'csv':
+                with open(scored['path'], 'rb') as results_file:
+                    st.download_button(
+                        label="Download Results as CSV",
+                        data=results_file,
+                        file_name=file_name,
+                        mime=mime
+                    )
+            elif st.button("Export Results"):
+                output = cache.get_or_compute(
+                    (export_format,) + scored['key'],
+                    lambda: build_export(scored, export_format)
+                )
                 
                 st.download_button(
-                    label="Download Results as Excel",
+                    label=f"Download Results as {export_format}",
                     data=output,
-                    file_name=f"ews_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    file_name=file_name,
+                    mime=mime
                 )
+            
+            # Keep dated results in the on-disk history
+            if scored.get('results') is not None and 'date' in scored['results'].columns:
+                st.markdown("### Result History")
+                if st.button(
+                    "Save to History",
+                    help="Append the dates not yet stored from this file for each borrower as a new run; see the History tab"
+                ):
+                    try:
+                        record = append_run(HISTORY_DIR, scored['results'], scored['entity_col'], uploaded_file.name)
+                        st.success(
+                            f"Saved run {record['run']}: {record['rows']:,} new rows, "
+                            f"{record['skipped']:,} already stored"
+                        )
+                    except ValueError as e:
+                        st.error(f"Could not save to history: {e}")
+            
+            cache_settings(cache)
         
         except Exception as e:
             st.error(f"Error processing file: {str(e)}")
@@ -396,6 +738,102 @@ def csv_upload_tab(step_values):
             ```
             """)
 
+def history_tab():
+    """Show the saved runs, status transitions between two runs and one borrower's history"""
+    manifest = load_runs(HISTORY_DIR)
+    if not manifest['runs']:
+        st.info("No saved runs yet. Score an upload with dates and click Save to History.")
+        return
+    
+    st.markdown("### Saved Runs")
+    st.dataframe(pd.DataFrame(manifest['runs']), use_container_width=True, hide_index=True)
+    
+    runs = [record['run'] for record in manifest['runs']]
+    entity_col = manifest['entity_col']
+    if len(runs) > 1:
+        st.markdown("### Status Transitions")
+        col1, col2 = st.columns(2)
+        with col1:
+            run_a = st.selectbox("From Run", runs[:-1], index=len(runs) - 2)
+        with col2:
+            later = [run for run in runs if run > run_a]
+            run_b = st.selectbox("To Run", later, index=len(later) - 1)
+        transitions = status_transitions(HISTORY_DIR, run_a, run_b)
+        worsened = transitions['Worsened'].astype(bool)
+        changed = f" across {transitions[entity_col].nunique():,} borrowers" if entity_col else ""
+        st.caption(f"{len(transitions):,} status changes{changed}, {int(worsened.sum()):,} worse")
+        if st.toggle("Worsened only"):
+            transitions = transitions[worsened]
+        st.dataframe(transitions, use_container_width=True, hide_index=True)
+    
+    st.markdown("### Borrower History")
+    entity = None
+    if entity_col:
+        entity = st.text_input(f"{entity_col}", help="Look up one borrower's stored rows across all runs").strip()
+        if not entity:
+            return
+    history = entity_history(HISTORY_DIR, entity)
+    if history.empty:
+        st.warning(f"No stored rows for {entity}")
+        return
+    st.caption(f"{len(history):,} rows from {history['date'].min():%Y-%m-%d} to {history['date'].max():%Y-%m-%d}")
+    for chart in create_charts({}, results_trend(history)):
+        if entity:
+            chart.update_layout(title=f"{entity} Metrics Trend Over Time")
+        st.plotly_chart(chart, use_container_width=True)
+    st.dataframe(history, use_container_width=True, hide_index=True)
+
+def threshold_settings():
+    """Let the user edit the band edges of every metric"""
+    thresholds = copy.deepcopy(DEFAULT_THRESHOLDS)
+    
+    with st.expander("🎚️ Configure Band Thresholds"):
+        st.markdown("### Band Threshold Configuration")
+        columns = st.columns(len(thresholds))
+        for column, (metric, band) in zip(columns, thresholds.items()):
+            with column:
+                st.markdown(f"#### {metric}")
+                operator = "≥" if band['direction'] == 'min' else "≤"
+                for i, label in enumerate(band['labels'][:-1]):
+                    band['edges'][i] = st.number_input(
+                        f"{metric} {label} ({operator} %)",
+                        value=float(band['edges'][i]),
+                        step=1.0
+                    )
+                st.caption(f"Otherwise {band['labels'][-1]}")
+    
+    try:
+        validate_thresholds(thresholds)
+    except ValueError as e:
+        st.error(f"Invalid thresholds, using defaults: {e}")
+        return DEFAULT_THRESHOLDS
+    return thresholds
+
+def weight_settings():
+    """Let the user edit the composite EWS score weight of each status column"""
+    weights = dict(COMPOSITE_WEIGHTS)
+    
+    with st.expander("⚖️ Configure Composite Score Weights"):
+        st.markdown("### EWS Score Weights")
+        st.caption("Weight of each status in the 0-100 EWS score; 0 leaves a status out")
+        names = [*METRIC_COLUMNS, RATING_STATUS_COLUMN]
+        columns = st.columns(len(names))
+        for column, name in zip(columns, names):
+            with column:
+                weights[name] = st.number_input(
+                    f"{name} weight",
+                    min_value=0.0,
+                    value=float(weights.get(name, 0.0)),
+                    step=0.5
+                )
+    
+    try:
+        validate_weights(weights)
+    except ValueError as e:
+        st.error(f"Invalid weights, using defaults: {e}")
+        return COMPOSITE_WEIGHTS
+    return weights
+
 def main():
     st.set_page_config(page_title="EWS Criteria Calculator", layout="wide")
     
@@ -471,14 +909,26 @@ def main():
         'balance': balance_step
     }
     
+    # Streak period lengths in days
+    period_days = {
+        'PVR': pvr_step,
+        'CLR': clr_step
+    }
+    
+    thresholds = threshold_settings()
+    weights = weight_settings()
+    
     # Create tabs
-    tab1, tab2 = st.tabs(["Manual Input", "CSV Upload"])
+    tab1, tab2, tab3 = st.tabs(["Manual Input", "CSV Upload", "History"])
     
     with tab1:
-        manual_input_tab(step_values)
+        manual_input_tab(step_values, thresholds, period_days)
     
     with tab2:
-        csv_upload_tab(step_values)
+        csv_upload_tab(step_values, thresholds, period_days, weights)
+    
+    with tab3:
+        history_tab()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""Sensitivity sweeps of band edges over scored EWS ratios
+
+A sweep moves one or two band edges over a grid of values and counts the
+rows in each status of a target column (Worst or a metric) for every
+configuration. Rows are first reduced, in chunks, to a histogram over
+everything a configuration can distinguish: the grid cell each swept ratio
+falls in, its band among the fixed edges and the worst status of the other
+columns. The status of every histogram cell under every configuration is
+then found in one broadcast over the grid, so the cost depends on the
+number of distinct cells rather than rows x configurations.
+"""
+import numpy as np
+import pandas as pd
+
+from ews_engine import (
+    DEFAULT_THRESHOLDS,
+    METRIC_COLUMNS,
+    RATING_STATUS_COLUMN,
+    STATUS_LABELS,
+    WORST_COLUMN,
+    compile_thresholds
+)
+
+# Rows binned per step of the histogram pass
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+# Histogram cells broadcast over the grid at a time
+DEFAULT_CELL_BLOCK = 4096
+
+# Most values along one sweep axis
+MAX_AXIS_VALUES = 500
+
+
+def edge_name(thresholds, metric, edge):
+    """Return a display name for a band edge, such as 'ILR Yellow/Orange (150)'"""
+    band = thresholds[metric]
+    return f"{metric} {band['labels'][edge]}/{band['labels'][edge + 1]} ({band['edges'][edge]:g})"
+
+
+def band_edges(thresholds):
+    """Return (metric, edge index) pairs of every band edge"""
+    return [(metric, edge) for metric, band in thresholds.items() for edge in range(len(band['edges']))]
+
+
+def sweep_axis(thresholds, metric, edge, values):
+    """Build a sweep axis moving one band edge over values (sorted and deduplicated)"""
+    if metric not in thresholds or not 0 <= edge < len(thresholds[metric]['edges']):
+        raise ValueError(f"{metric} has no band edge {edge}")
+    values = np.unique(np.asarray(values, dtype=np.float64))
+    if not 0 < len(values) <= MAX_AXIS_VALUES or np.isnan(values).any():
+        raise ValueError(f"A sweep axis needs 1 to {MAX_AXIS_VALUES} values")
+    return {'metric': metric, 'edge': edge, 'values': values}
+
+
+def _ratios(df_ratios, metric):
+    """Return a metric's ratios as the bands see them: 0 for zero denominators, NaN for missing inputs"""
+    return df_ratios[f'{metric}_Value'].to_numpy(dtype=np.float64, na_value=0.0)
+
+
+def _beyond(edges, ratios, direction):
+    """Count the edges each ratio lies beyond (above for 'max' bands, below for 'min' bands)"""
+    edges = np.sort(np.asarray(edges, dtype=np.float64))
+    if direction == 'max':
+        return np.searchsorted(edges, ratios, side='left')
+    return len(edges) - np.searchsorted(edges, ratios, side='right')
+
+
+def sweep(df_ratios, axes, thresholds=None, target=WORST_COLUMN, rows=None,
+          chunk_rows=DEFAULT_CHUNK_ROWS, cell_block=DEFAULT_CELL_BLOCK):
+    """Count the target's statuses for every configuration of one or two swept band edges
+
+    df_ratios is a ratio or results frame with the *_Value columns (and the
+    Credit_Rating status if present). target is Worst or a swept metric. axes are built with sweep_axis; edges
+    not swept keep their value in thresholds. Swept edges may cross the fixed
+    ones; a ratio's band is then the number of edges it lies beyond. rows
+    optionally selects the rows counted (a boolean mask). Streak statuses are
+    not recounted. Returns an int64 array of shape (len(values of axis 1),
+    len(values of axis 2) or 1, len(STATUS_LABELS)).
+    """
+    thresholds = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+    if not 1 <= len(axes) <= 2:
+        raise ValueError("A sweep needs one or two axes")
+    if target != WORST_COLUMN and target not in [axis['metric'] for axis in axes]:
+        raise ValueError(f"Cannot count {target}; use {WORST_COLUMN} or a swept metric")
+    for axis in axes:
+        if f"{axis['metric']}_Value" not in df_ratios.columns:
+            raise ValueError(f"No {axis['metric']} ratios to sweep")
+    if len(axes) == 2 and (axes[0]['metric'], axes[0]['edge']) == (axes[1]['metric'], axes[1]['edge']):
+        raise ValueError("The two sweep axes move the same edge")
+
+    swept = list(dict.fromkeys(axis['metric'] for axis in axes))
+    grid_shape = tuple(len(axis['values']) for axis in axes) + (1,) * (2 - len(axes))
+    kernels = compile_thresholds(thresholds)
+    # Columns other than the swept metrics only matter through their worst status
+    fixed_cols = []
+    if target == WORST_COLUMN:
+        fixed_cols = [metric for metric in METRIC_COLUMNS if metric not in swept and f'{metric}_Value' in df_ratios.columns]
+    fixed_rating = target == WORST_COLUMN and RATING_STATUS_COLUMN in df_ratios.columns
+    # Per swept metric: its fixed edges, plus a last position for NaN ratios
+    fixed_edges = {
+        metric: [edge for i, edge in enumerate(thresholds[metric]['edges'])
+                 if not any(axis['metric'] == metric and axis['edge'] == i for axis in axes)]
+        for metric in swept
+    }
+    cell_shape = (
+        (len(STATUS_LABELS) + 1,)
+        + tuple(len(fixed_edges[metric]) + 2 for metric in swept)
+        + tuple(len(axis['values']) + 1 for axis in axes)
+    )
+
+    # Histogram of rows over the cells, a chunk of rows at a time
+    selected = np.flatnonzero(rows) if rows is not None else None
+    total_rows = len(selected) if selected is not None else len(df_ratios)
+    ratios = {metric: _ratios(df_ratios, metric) for metric in [*swept, *fixed_cols]}
+    rating_codes = df_ratios[RATING_STATUS_COLUMN].cat.codes.to_numpy() if fixed_rating else None
+    cells = np.zeros(int(np.prod(cell_shape)), dtype=np.int64)
+    for start in range(0, total_rows, chunk_rows):
+        picked = selected[start:start + chunk_rows] if selected is not None else slice(start, start + chunk_rows)
+        worst = np.full(min(chunk_rows, total_rows - start), -1, dtype=np.int8)
+        for metric in fixed_cols:
+            worst = np.maximum(worst, kernels[metric](ratios[metric][picked]))
+        if fixed_rating:
+            worst = np.maximum(worst, rating_codes[picked])
+        index = [worst.astype(np.int64) + 1]
+        for metric in swept:
+            chunk = ratios[metric][picked]
+            position = _beyond(fixed_edges[metric], chunk, thresholds[metric]['direction'])
+            index.append(np.where(np.isnan(chunk), len(fixed_edges[metric]) + 1, position))
+        for axis in axes:
+            chunk = ratios[axis['metric']][picked]
+            side = 'left' if thresholds[axis['metric']]['direction'] == 'max' else 'right'
+            index.append(np.searchsorted(axis['values'], chunk, side=side))
+        cells += np.bincount(np.ravel_multi_index(index, cell_shape), minlength=len(cells))
+
+    # Status of every occupied cell under every configuration, a block of cells at a time
+    label_codes = {
+        metric: np.array([STATUS_LABELS.index(label) for label in thresholds[metric]['labels']], dtype=np.int8)
+        for metric in swept
+    }
+    occupied = np.flatnonzero(cells)
+    counts = np.zeros((len(STATUS_LABELS), grid_shape[0] * grid_shape[1]), dtype=np.int64)
+    grid_index = [
+        np.arange(grid_shape[0]).reshape(1, -1, 1),
+        np.arange(grid_shape[1]).reshape(1, 1, -1)
+    ]
+    for start in range(0, len(occupied), cell_block):
+        block = occupied[start:start + cell_block]
+        parts = [part.reshape(-1, 1, 1) for part in np.unravel_index(block, cell_shape)]
+        worst, positions, grid_cells = parts[0] - 1, parts[1:1 + len(swept)], parts[1 + len(swept):]
+        status = np.broadcast_to(worst, (len(block),) + grid_shape).astype(np.int8)
+        for metric, position in zip(swept, positions):
+            band = thresholds[metric]
+            count = np.broadcast_to(np.minimum(position, len(fixed_edges[metric])), (len(block),) + grid_shape)
+            for a, axis in enumerate(axes):
+                if axis['metric'] == metric:
+                    # Swept edge value i lies below (max) or above (min) the ratio
+                    if band['direction'] == 'max':
+                        count = count + (grid_index[a] < grid_cells[a])
+                    else:
+                        count = count + (grid_index[a] >= grid_cells[a])
+            count = np.where(position > len(fixed_edges[metric]), len(band['edges']), count)
+            codes = label_codes[metric][count]
+            if metric == target:
+                status = codes
+            elif target == WORST_COLUMN:
+                status = np.maximum(status, codes)
+        weights = cells[block].astype(np.float64)
+        flat = status.reshape(len(block), -1)
+        for code in range(len(STATUS_LABELS)):
+            counts[code] += np.rint(weights @ (flat == code)).astype(np.int64)
+
+    return np.moveaxis(counts.reshape((len(STATUS_LABELS),) + grid_shape), 0, -1)
+
+
+def sweep_table(counts, axes, thresholds=None):
+    """Return a table of the status counts of every sweep configuration, one row each"""
+    thresholds = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+    grids = np.meshgrid(*[axis['values'] for axis in axes], indexing='ij')
+    columns = {
+        f"{axis['metric']} {thresholds[axis['metric']]['labels'][axis['edge']]}/"
+        f"{thresholds[axis['metric']]['labels'][axis['edge'] + 1]} Edge": grid.ravel()
+        for axis, grid in zip(axes, grids)
+    }
+    flat = counts.reshape(-1, len(STATUS_LABELS))
+    for code, label in enumerate(STATUS_LABELS):
+        columns[label] = flat[:, code]
+    return pd.DataFrame(columns)
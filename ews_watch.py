@@ -0,0 +1,269 @@
+"""Watch a folder and score new or modified EWS files into a results history store
+
+Files are scored in a process pool as soon as they stop changing. Each
+scored file is appended to the history store as a run (see
+ews_store.append_run) that replaces the rows stored from an earlier version
+of the same file, so status_transitions and entity_history read what the
+watcher writes. A checkpoint in the store records the size and
+modification time of every scored file, so a restart only scores files that
+are new or have changed.
+
+Example:
+    python ews_watch.py incoming/ --store ews_history --workers 4
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from ews_engine import add_streaks, score_frame
+from ews_groups import DEFAULT_ENTITY_COLUMN, score_grouped
+from ews_io import FILE_FORMATS, load_file
+from ews_store import HISTORY_DIR, append_run
+
+# Checkpoint of scored files, kept in the store directory
+CHECKPOINT_FILE = '_checkpoint.json'
+
+# A file must be unchanged for this long before it is scored
+DEFAULT_SETTLE_SECONDS = 0.2
+
+# How often the main loop checks for settled files and finished work
+POLL_SECONDS = 0.05
+
+
+def file_signature(path):
+    """Return the size and modification time that identify a version of a file"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_checkpoint(store_dir):
+    """Read the checkpoint of scored files, or an empty one"""
+    path = os.path.join(store_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(store_dir, checkpoint):
+    """Write the checkpoint atomically"""
+    path = os.path.join(store_dir, CHECKPOINT_FILE)
+    with open(path + '.tmp', 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def is_input_file(path, store_dir):
+    """Return whether a path is a scoreable input file outside the store"""
+    if os.path.splitext(path)[1].lower() not in FILE_FORMATS:
+        return False
+    store = os.path.abspath(store_dir) + os.sep
+    return not os.path.abspath(path).startswith(store)
+
+
+def score_file(path, entity_col=None, period_days=None):
+    """Score one file (runs in a worker process)
+
+    Returns the results frame, the entity column it was scored by (None if
+    the file has none), the rejected row count and the scoring time. The
+    calling process appends the results to the store, one run at a time.
+    """
+    start = time.perf_counter()
+    stats = {}
+    extra_columns = (entity_col,) if entity_col else ()
+    df = load_file(path, stats=stats, extra_columns=extra_columns)
+    grouped = entity_col if entity_col and entity_col in df.columns else None
+    if grouped:
+        df_results = score_grouped(df, grouped, period_days=period_days, workers=1)
+    else:
+        df_results = add_streaks(score_frame(df), period_days)
+    return {
+        'results': df_results,
+        'entity_col': grouped,
+        'rejected': stats.get('rejected_count', 0),
+        'seconds': time.perf_counter() - start
+    }
+
+
+def pending_files(directory, store_dir, checkpoint, recursive=False):
+    """Return input files in directory that are new or changed since the checkpoint"""
+    pending = []
+    for root, dirs, files in os.walk(directory):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if is_input_file(path, store_dir):
+                scored = checkpoint.get(os.path.abspath(path))
+                signature = file_signature(path)
+                if scored is None or scored['size'] != signature['size'] or scored['mtime_ns'] != signature['mtime_ns']:
+                    pending.append(path)
+        if not recursive:
+            break
+    return pending
+
+
+class FolderHandler(FileSystemEventHandler):
+    """Queue the paths of created, modified or moved-in input files"""
+
+    def __init__(self, events, store_dir):
+        self.events = events
+        self.store_dir = store_dir
+
+    def _queue(self, path):
+        if is_input_file(path, self.store_dir):
+            self.events.put((path, time.monotonic()))
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._queue(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._queue(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._queue(event.dest_path)
+
+
+def watch(directory, store_dir, workers=None, entity_col=None, period_days=None,
+          settle_seconds=DEFAULT_SETTLE_SECONDS, recursive=False, once=False, stop_event=None):
+    """Score pending files, then keep scoring new or modified files until stopped
+
+    A file is scored once it has had no events for settle_seconds and its
+    size and modification time are stable. A file that changes while it is
+    being scored is scored again afterwards. With once=True only the files
+    pending at start are scored. stop_event (a threading.Event) ends the loop.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    checkpoint = load_checkpoint(store_dir)
+    events = queue.Queue()
+    # Path -> (first event time, last event time)
+    due = {}
+    running = {}
+
+    now = time.monotonic()
+    for path in pending_files(directory, store_dir, checkpoint, recursive):
+        due[path] = (now, now - settle_seconds)
+
+    observer = None
+    if not once:
+        observer = Observer()
+        observer.schedule(FolderHandler(events, store_dir), directory, recursive=recursive)
+        observer.start()
+
+    executor = ProcessPoolExecutor(max_workers=max(1, workers or os.cpu_count()))
+    try:
+        while True:
+            # Collect file events, keeping the first and the latest time per path
+            while True:
+                try:
+                    path, seen = events.get_nowait()
+                except queue.Empty:
+                    break
+                first = due[path][0] if path in due else seen
+                due[path] = (first, seen)
+
+            # Submit settled files that are not already being scored
+            now = time.monotonic()
+            for path, (first, last) in list(due.items()):
+                if path in running or now - last < settle_seconds:
+                    continue
+                del due[path]
+                if not os.path.exists(path):
+                    continue
+                signature = file_signature(path)
+                scored = checkpoint.get(os.path.abspath(path))
+                if scored is not None and scored['size'] == signature['size'] and scored['mtime_ns'] == signature['mtime_ns']:
+                    continue
+                future = executor.submit(score_file, path, entity_col, period_days)
+                running[path] = (future, signature, first)
+
+            # Append finished files to the history and record them in the checkpoint
+            for path, (future, signature, first) in list(running.items()):
+                if not future.done():
+                    continue
+                del running[path]
+                try:
+                    result = future.result()
+                    record = append_run(
+                        store_dir, result['results'], result['entity_col'], os.path.abspath(path), replace=True
+                    )
+                except Exception as e:
+                    print(f"Error processing {path}: {e}", file=sys.stderr)
+                    continue
+                if not record['rows'] and record['skipped']:
+                    # Not checkpointed, so the file is scored again once it changes or on restart
+                    print(f"No dated rows stored from {path}; skipped {record['skipped']:,}", file=sys.stderr)
+                    continue
+                checkpoint[os.path.abspath(path)] = {
+                    **signature, 'run': record['run'], 'rows': record['rows'], 'scored_at': time.time()
+                }
+                save_checkpoint(store_dir, checkpoint)
+                print(
+                    f"Scored {len(result['results']):,} rows from {path} in {time.monotonic() - first:.2f}s "
+                    f"(run {record['run']}: {record['rows']:,} stored, {record['skipped']:,} undated)"
+                )
+                if result['rejected']:
+                    print(f"  Rejected {result['rejected']:,} malformed rows from {path}", file=sys.stderr)
+                # Score again if the file changed while it was being scored
+                if os.path.exists(path) and file_signature(path) != signature:
+                    due.setdefault(path, (time.monotonic(), time.monotonic()))
+
+            if once and not due and not running:
+                break
+            if stop_event is not None and stop_event.is_set():
+                break
+            time.sleep(POLL_SECONDS)
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        executor.shutdown(cancel_futures=True)
+
+    return checkpoint
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Watch a folder and score new EWS files into a results history")
+    parser.add_argument("directory", help="Folder to watch for CSV, Parquet or Arrow IPC files")
+    parser.add_argument("-s", "--store", default=HISTORY_DIR, help="Directory of the results history store")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--entity-column", default=DEFAULT_ENTITY_COLUMN, help="Entity key column scored per entity when present (empty to disable)")
+    parser.add_argument("--pvr-period-days", type=int, default=1, help="Days per consecutive PVR period")
+    parser.add_argument("--clr-period-days", type=int, default=1, help="Days per consecutive CLR period")
+    parser.add_argument("--settle-seconds", type=float, default=DEFAULT_SETTLE_SECONDS, help="Quiet time before a changed file is scored")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Also watch subfolders")
+    parser.add_argument("--once", action="store_true", help="Score new and changed files, then exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the watcher until interrupted"""
+    args = parse_args(argv)
+    if not os.path.isdir(args.directory):
+        print(f"Not a directory: {args.directory}", file=sys.stderr)
+        return 2
+
+    period_days = {'PVR': args.pvr_period_days, 'CLR': args.clr_period_days}
+    if not args.once:
+        print(f"Watching {args.directory} (results in {args.store}); press Ctrl+C to stop")
+    try:
+        watch(
+            args.directory, args.store, args.workers, args.entity_column or None, period_days,
+            args.settle_seconds, args.recursive, args.once
+        )
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
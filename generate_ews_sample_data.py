@@ -1,14 +1,74 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
 
-# Set random seed for reproducibility
-np.random.seed(42)
+# Seed of the default sample data
+DEFAULT_SEED = 42
+
+# Rows per independently seeded chunk; output depends on this, not on the worker count
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+# Daily dates wrap after this many days to stay within the pandas timestamp range
+MAX_DAYS = 36_500
+
+START_DATE = np.datetime64('2023-01-01')
+
+# Credit ratings from best to worst
+CREDIT_RATINGS = ['Good', 'B1', 'B2', 'B3', 'Bad Debt']
+
+# Monthly credit rating transition matrices (rows: from, columns: to, in CREDIT_RATINGS order)
+RATING_TRANSITIONS = {
+    'stable': [
+        [0.97, 0.03, 0.00, 0.00, 0.00],
+        [0.10, 0.87, 0.03, 0.00, 0.00],
+        [0.02, 0.10, 0.85, 0.03, 0.00],
+        [0.00, 0.02, 0.10, 0.85, 0.03],
+        [0.00, 0.00, 0.00, 0.02, 0.98]
+    ],
+    'downgrade': [
+        [0.75, 0.20, 0.05, 0.00, 0.00],
+        [0.00, 0.70, 0.25, 0.05, 0.00],
+        [0.00, 0.00, 0.70, 0.25, 0.05],
+        [0.00, 0.00, 0.00, 0.80, 0.20],
+        [0.00, 0.00, 0.00, 0.00, 1.00]
+    ],
+    'upgrade': [
+        [1.00, 0.00, 0.00, 0.00, 0.00],
+        [0.25, 0.75, 0.00, 0.00, 0.00],
+        [0.05, 0.25, 0.70, 0.00, 0.00],
+        [0.00, 0.05, 0.25, 0.70, 0.00],
+        [0.00, 0.00, 0.05, 0.15, 0.80]
+    ]
+}
+
+# Borrower scenarios. Health moves linearly from start to end over ramp_days
+# from a random onset day; ratings follow the before/after transition matrix.
+SCENARIOS = {
+    'healthy': {'start': 1.0, 'end': 1.0, 'ramp_days': 1, 'rating': 'Good', 'before': 'stable', 'after': 'stable'},
+    'deteriorating': {'start': 1.0, 'end': 0.3, 'ramp_days': 365, 'rating': 'Good', 'before': 'stable', 'after': 'downgrade'},
+    'shock': {'start': 1.0, 'end': 0.25, 'ramp_days': 1, 'rating': 'Good', 'before': 'stable', 'after': 'downgrade'},
+    'recovering': {'start': 0.35, 'end': 1.0, 'ramp_days': 270, 'rating': 'B2', 'before': 'stable', 'after': 'upgrade'}
+}
+
+# Default share of borrowers in each scenario
+DEFAULT_SCENARIO_WEIGHTS = {'healthy': 0.6, 'deteriorating': 0.2, 'shock': 0.1, 'recovering': 0.1}
+
+# Borrowers per independently seeded chunk
+DEFAULT_CHUNK_BORROWERS = 10_000
 
-def generate_sample_data(num_rows=1000):
-    # Generate dates
-    start_date = datetime(2023, 1, 1)
-    dates = [start_date + timedelta(days=x) for x in range(num_rows)]
+def chunk_seeds(num_rows, seed=DEFAULT_SEED, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Return (first row, row count, seed sequence) for every chunk of a dataset"""
+    starts = range(0, num_rows, chunk_rows)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    return [(start, min(chunk_rows, num_rows - start), chunk_seed) for start, chunk_seed in zip(starts, seeds)]
+
+def generate_chunk(start, num_rows, seed):
+    """Generate rows start .. start + num_rows of the sample data with their own generator"""
+    rng = np.random.default_rng(seed)
+    x = np.arange(start, start + num_rows, dtype=np.float64)
     
     # Base values with some randomness
     base_volume = 1000
@@ -18,67 +78,223 @@ def generate_sample_data(num_rows=1000):
     
     # Generate data with realistic patterns
     data = {
-        'date': dates,
-        'actual_volume': [
-            max(0, base_volume + np.random.normal(0, 200) + 100 * np.sin(x/30)) 
-            for x in range(num_rows)
-        ],
-        'target_volume': [
-            base_volume * 1.2 + np.random.normal(0, 100)
-            for _ in range(num_rows)
-        ],
-        'actual_inventory': [
-            max(0, base_inventory + np.random.normal(0, 100) + 50 * np.sin(x/45))
-            for x in range(num_rows)
-        ],
-        'planned_inventory': [
-            base_inventory + np.random.normal(0, 50)
-            for _ in range(num_rows)
-        ],
-        'outstanding_loan_other': [
-            max(0, base_loan * 0.1 + np.random.normal(0, 100))
-            for _ in range(num_rows)
-        ],
-        'credit_limit': [base_loan for _ in range(num_rows)],
-        'cash_balance': [
-            max(0, base_balance + np.random.normal(0, 300) + 200 * np.sin(x/60))
-            for x in range(num_rows)
-        ],
-        'loan_amount': [
-            max(0, base_balance * 0.8 + np.random.normal(0, 200))
-            for _ in range(num_rows)
-        ],
-        'account_balance': [
-            max(0, base_balance + np.random.normal(0, 250) + 150 * np.sin(x/40))
-            for x in range(num_rows)
-        ]
+        'date': (START_DATE + (np.arange(start, start + num_rows) % MAX_DAYS).astype('timedelta64[D]')).astype('datetime64[ns]'),
+        'actual_volume': np.maximum(0, base_volume + rng.normal(0, 200, num_rows) + 100 * np.sin(x / 30)),
+        'target_volume': base_volume * 1.2 + rng.normal(0, 100, num_rows),
+        'actual_inventory': np.maximum(0, base_inventory + rng.normal(0, 100, num_rows) + 50 * np.sin(x / 45)),
+        'planned_inventory': base_inventory + rng.normal(0, 50, num_rows),
+        'outstanding_loan_other': np.maximum(0, base_loan * 0.1 + rng.normal(0, 100, num_rows)),
+        'credit_limit': np.full(num_rows, float(base_loan)),
+        'cash_balance': np.maximum(0, base_balance + rng.normal(0, 300, num_rows) + 200 * np.sin(x / 60)),
+        'loan_amount': np.maximum(0, base_balance * 0.8 + rng.normal(0, 200, num_rows)),
+        'account_balance': np.maximum(0, base_balance + rng.normal(0, 250, num_rows) + 150 * np.sin(x / 40))
     }
     
-    # Convert to DataFrame
-    df = pd.DataFrame(data)
-    
     # Round all numeric columns to 2 decimal places
-    numeric_columns = df.select_dtypes(include=[np.number]).columns
-    df[numeric_columns] = df[numeric_columns].round(2)
+    for column, values in data.items():
+        if column != 'date':
+            data[column] = np.round(values, 2)
+    
+    return pd.DataFrame(data, index=pd.RangeIndex(start, start + num_rows))
+
+def generate_sample_data(num_rows=1000, seed=DEFAULT_SEED, chunk_rows=DEFAULT_CHUNK_ROWS, workers=1):
+    """Generate num_rows of daily sample data, in chunks across worker processes
     
-    # Sort by date
-    df = df.sort_values('date')
+    Every chunk has its own generator spawned from seed, so the data is the
+    same for any number of workers.
+    """
+    chunks = chunk_seeds(num_rows, seed, chunk_rows)
+    if workers <= 1 or len(chunks) <= 1:
+        parts = [generate_chunk(*chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(generate_chunk, *zip(*chunks)))
     
+    if not parts:
+        return generate_chunk(0, 0, np.random.SeedSequence(seed)).reset_index(drop=True)
+    return pd.concat(parts).reset_index(drop=True)
+
+def borrower_health(scenarios, onsets, days):
+    """Return the (borrowers, days) health multipliers of each borrower's scenario"""
+    start = np.array([SCENARIOS[name]['start'] for name in SCENARIOS])[scenarios]
+    end = np.array([SCENARIOS[name]['end'] for name in SCENARIOS])[scenarios]
+    ramp_days = np.array([SCENARIOS[name]['ramp_days'] for name in SCENARIOS])[scenarios]
+    progress = np.clip((days[None, :] - onsets[:, None]) / ramp_days[:, None], 0, 1)
+    return start[:, None] + (end - start)[:, None] * progress
+
+def rating_paths(rng, scenarios, onsets, num_days, transitions=None):
+    """Simulate monthly credit rating transitions, returning (borrowers, days) rating codes"""
+    transitions = RATING_TRANSITIONS if transitions is None else transitions
+    cumulative = {name: np.cumsum(np.asarray(matrix), axis=1) for name, matrix in transitions.items()}
+    before = np.array([SCENARIOS[name]['before'] for name in SCENARIOS])[scenarios]
+    after = np.array([SCENARIOS[name]['after'] for name in SCENARIOS])[scenarios]
+    ratings = np.array([CREDIT_RATINGS.index(SCENARIOS[name]['rating']) for name in SCENARIOS])[scenarios]
+    
+    num_months = -(-num_days // 30)
+    monthly = np.empty((len(scenarios), num_months), dtype=np.int8)
+    monthly[:, 0] = ratings
+    for month in range(1, num_months):
+        # Each borrower moves by its scenario's matrix for this phase
+        phase = np.where(month * 30 >= onsets, after, before)
+        draws = rng.random(len(scenarios))
+        for name, matrix in cumulative.items():
+            rows = phase == name
+            if rows.any():
+                ratings[rows] = np.minimum((draws[rows, None] > matrix[ratings[rows]]).sum(axis=1), len(CREDIT_RATINGS) - 1)
+        monthly[:, month] = ratings
+    return np.repeat(monthly, 30, axis=1)[:, :num_days]
+
+def generate_borrower_chunk(first_borrower, num_borrowers, seed, num_days=365, scenario_weights=None,
+                            transitions=None):
+    """Generate num_days of daily data for borrowers first_borrower .. first_borrower + num_borrowers"""
+    rng = np.random.default_rng(seed)
+    scenario_weights = DEFAULT_SCENARIO_WEIGHTS if scenario_weights is None else scenario_weights
+    weights = np.array([scenario_weights.get(name, 0) for name in SCENARIOS], dtype=np.float64)
+    scenarios = rng.choice(len(SCENARIOS), size=num_borrowers, p=weights / weights.sum())
+    onsets = rng.uniform(0.1, 0.7, num_borrowers) * num_days
+    days = np.arange(num_days)
+    shape = (num_borrowers, num_days)
+    
+    # Borrower scale and daily health
+    loan_amount = rng.lognormal(np.log(2000), 0.5, num_borrowers)[:, None]
+    target_volume = rng.lognormal(np.log(1200), 0.5, num_borrowers)[:, None]
+    planned_inventory = rng.lognormal(np.log(500), 0.5, num_borrowers)[:, None]
+    health = borrower_health(scenarios, onsets, days)
+    season = 1 + 0.05 * np.sin(2 * np.pi * days / 7)[None, :]
+    
+    def noisy(values, sigma=0.1):
+        return np.round(values * rng.lognormal(0, sigma, shape), 2)
+    
+    data = {
+        'borrower': np.repeat(np.arange(first_borrower, first_borrower + num_borrowers), num_days),
+        'date': np.tile(START_DATE + days.astype('timedelta64[D]'), num_borrowers).astype('datetime64[ns]'),
+        'actual_volume': noisy(target_volume * 0.9 * health * season),
+        'target_volume': noisy(target_volume * np.ones(shape), 0.02),
+        'actual_inventory': noisy(planned_inventory * (1 + 0.9 * (1 - health))),
+        'planned_inventory': noisy(planned_inventory * np.ones(shape), 0.02),
+        'outstanding_loan_other': noisy(loan_amount * 1.25 * (0.08 + 0.3 * (1 - health))),
+        'credit_limit': np.round(np.broadcast_to(loan_amount * 1.25, shape), 2),
+        'cash_balance': noisy(loan_amount * 1.1 * health),
+        'loan_amount': np.round(np.broadcast_to(loan_amount, shape), 2),
+        'account_balance': noisy(loan_amount * 1.3 * health),
+        'credit_rating': rating_paths(rng, scenarios, onsets, num_days, transitions),
+        'scenario': np.repeat(scenarios, num_days)
+    }
+    
+    return pd.DataFrame({column: np.ravel(values) for column, values in data.items()})
+
+def label_borrowers(df, num_borrowers):
+    """Turn the integer borrower, rating and scenario codes into categorical labels"""
+    names = [f"B{i:07d}" for i in range(num_borrowers)]
+    borrower_id = pd.Categorical.from_codes(df.pop('borrower'), categories=names)
+    df.insert(0, 'borrower_id', borrower_id)
+    df['credit_rating'] = pd.Categorical.from_codes(df['credit_rating'], categories=CREDIT_RATINGS, ordered=True)
+    df['scenario'] = pd.Categorical.from_codes(df['scenario'], categories=list(SCENARIOS))
     return df
 
-if __name__ == "__main__":
-    # Generate sample data
-    df = generate_sample_data(1000)
+def generate_borrower_data(num_borrowers=100, num_days=365, seed=DEFAULT_SEED, scenario_weights=None,
+                           transitions=None, chunk_borrowers=DEFAULT_CHUNK_BORROWERS, workers=1):
+    """Generate daily data for many borrowers following healthy, deteriorating, shock or recovering scenarios
     
-    # Save to CSV
-    output_file = "ews_sample_data.csv"
-    df.to_csv(output_file, index=False)
-    print(f"Generated {len(df)} rows of sample data in {output_file}")
+    Rows are ordered by borrower then date. The scenario column records each
+    borrower's scenario. As with generate_sample_data, chunks of borrowers are
+    seeded independently so the data is the same for any number of workers.
+    """
+    chunks = chunk_seeds(num_borrowers, seed, chunk_borrowers)
+    options = (num_days, scenario_weights, transitions)
+    if workers <= 1 or len(chunks) <= 1:
+        parts = [generate_borrower_chunk(*chunk, *options) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(generate_borrower_chunk, *chunk, *options) for chunk in chunks]
+            parts = [future.result() for future in futures]
     
-    # Display some statistics
-    print("\nData Statistics:")
-    print(df.describe())
+    df = pd.concat(parts, ignore_index=True) if parts else generate_borrower_chunk(0, 0, seed, num_days)
+    return label_borrowers(df, num_borrowers)
+
+def write_chunk(start, num_rows, seed, output_dir, output_format):
+    """Generate one chunk and write it as its own partition file"""
+    df = generate_chunk(start, num_rows, seed)
+    return write_partition(df, os.path.join(output_dir, f"part-{start:012d}.{output_format}"), output_format)
+
+def write_borrower_chunk(first_borrower, num_borrowers, seed, output_dir, output_format, total_borrowers, options):
+    """Generate one chunk of borrowers and write it as its own partition file"""
+    df = label_borrowers(generate_borrower_chunk(first_borrower, num_borrowers, seed, *options), total_borrowers)
+    path = os.path.join(output_dir, f"part-{first_borrower:012d}.{output_format}")
+    return write_partition(df, path, output_format)
+
+def write_partition(df, path, output_format):
+    """Write one partition file and return its path"""
+    if output_format == 'csv':
+        df.to_csv(path, index=False)
+    else:
+        df.to_parquet(path, index=False)
+    return path
+
+def write_partitioned(output_dir, num_rows, seed=DEFAULT_SEED, chunk_rows=DEFAULT_CHUNK_ROWS,
+                      workers=None, output_format='parquet', num_days=None, scenario_weights=None):
+    """Generate sample data chunk by chunk in parallel, one partition file per chunk
+    
+    With num_days, num_rows is the number of borrowers (chunk_rows borrowers
+    per file) and scenario data is generated as in generate_borrower_data.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    chunks = chunk_seeds(num_rows, seed, chunk_rows)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if num_days is None:
+            futures = [
+                executor.submit(write_chunk, start, rows, chunk_seed, output_dir, output_format)
+                for start, rows, chunk_seed in chunks
+            ]
+        else:
+            options = (num_days, scenario_weights)
+            futures = [
+                executor.submit(write_borrower_chunk, start, rows, chunk_seed, output_dir, output_format, num_rows, options)
+                for start, rows, chunk_seed in chunks
+            ]
+        return [future.result() for future in futures]
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    parser = argparse.ArgumentParser(description="Generate EWS sample data")
+    parser.add_argument("--rows", type=int, default=1000, help="Number of rows")
+    parser.add_argument("--borrowers", type=int, help="Generate scenario data for this many borrowers instead")
+    parser.add_argument("--days", type=int, default=365, help="Days of data per borrower")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Random seed")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per seeded chunk and partition file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--output", default="ews_sample_data.csv", help="Single CSV output file")
+    parser.add_argument("--output-dir", help="Write partition files to this directory instead")
+    parser.add_argument("--format", choices=['csv', 'parquet'], default='parquet', help="Partition file format")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
     
-    # Display first few rows
-    print("\nFirst few rows:")
-    print(df.head())
\ No newline at end of file
+    if args.output_dir and args.borrowers:
+        paths = write_partitioned(
+            args.output_dir, args.borrowers, args.seed, DEFAULT_CHUNK_BORROWERS, args.workers, args.format, args.days
+        )
+        print(f"Generated {args.borrowers:,} borrowers x {args.days} days in {len(paths)} files under {args.output_dir}")
+    elif args.output_dir:
+        paths = write_partitioned(args.output_dir, args.rows, args.seed, args.chunk_rows, args.workers, args.format)
+        print(f"Generated {args.rows:,} rows of sample data in {len(paths)} files under {args.output_dir}")
+    else:
+        # Generate sample data
+        if args.borrowers:
+            df = generate_borrower_data(args.borrowers, args.days, args.seed, workers=args.workers)
+        else:
+            df = generate_sample_data(args.rows, args.seed, args.chunk_rows, args.workers)
+        
+        # Save to CSV
+        output_file = args.output
+        df.to_csv(output_file, index=False)
+        print(f"Generated {len(df)} rows of sample data in {output_file}")
+        
+        # Display some statistics
+        print("\nData Statistics:")
+        print(df.describe())
+        
+        # Display first few rows
+        print("\nFirst few rows:")
+        print(df.head())